@@ -0,0 +1,58 @@
+# compares encode time and size of animated output formats on fly animations, run from repository root with:
+#   uv run python -m scripts.benchmark_animation [image ...]
+# without arguments synthetic images are used
+
+import sys
+import time
+
+from PIL import Image
+
+from src.cogs.images.animation import AnimationFormat
+from src.cogs.images.flies import MAX_SIDE, FlyDrawer
+
+AMOUNTS = (1, 10, 50)
+STEPS = 100
+SPEED = 10
+
+
+def sample_images() -> dict[str, Image.Image]:
+    if len(sys.argv) > 1:
+        images = {}
+        for path in sys.argv[1:]:
+            with Image.open(path) as img:
+                img.thumbnail((MAX_SIDE, MAX_SIDE))
+                images[path] = img.convert("RGB")
+
+        return images
+
+    size = (MAX_SIDE, MAX_SIDE * 3 // 4)
+    gradient = Image.linear_gradient("L").resize(size)
+
+    return {
+        "noise": Image.effect_noise(size, 60).convert("RGB"),
+        "smooth": Image.merge("RGB", (gradient, gradient.rotate(90), Image.effect_noise(size, 10))),
+    }
+
+
+def main() -> None:
+    print(f"{'image':>10} {'flies':>5} {'format':>6} {'time':>9} {'size':>10}")
+
+    for name, img in sample_images().items():
+        for amount in AMOUNTS:
+            drawer = FlyDrawer(img, amount, SPEED, steps=STEPS)
+
+            for animation_format in AnimationFormat:
+                start = time.perf_counter()
+                result = drawer.run(animation_format)
+                elapsed = time.perf_counter() - start
+
+                print(
+                    f"{name:>10} {amount:>5} {animation_format.value:>6} {elapsed * 1000:>7.0f}ms "
+                    f"{len(result) / 1024:>8.0f}KB"
+                )
+
+            drawer.cleanup()
+
+
+if __name__ == "__main__":
+    main()
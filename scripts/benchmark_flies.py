@@ -0,0 +1,58 @@
+# measures fly sprite loading and per-frame compositing cost, run from repository root with:
+#   uv run python -m scripts.benchmark_flies
+
+import timeit
+
+from collections.abc import Callable
+
+from PIL import Image
+
+from src.cogs.images.flies import DIRECTIONS, FINAL_STATE, FIRST_STATE, FLY_SIDE, FlyDrawer, SpriteAtlas
+
+BACKGROUND_SIZE = (512, 384)
+STEPS = 100
+REPEAT = 5
+
+
+def best(fn: Callable[[], object], number: int) -> float:
+    """Best average time of single call in milliseconds"""
+
+    return min(timeit.repeat(fn, number=number, repeat=REPEAT)) / number * 1000
+
+
+def open_templates() -> None:
+    # what every drawer used to do before atlas: open each template and decode it on first composite
+    for prefix in DIRECTIONS.values():
+        for state in range(FIRST_STATE, FINAL_STATE + 1):
+            with Image.open(SpriteAtlas.TEMPLATES_PATH / f"{prefix}_{state}.png") as img:
+                img.load()
+
+
+def main() -> None:
+    background = Image.effect_noise(BACKGROUND_SIZE, 40).convert("RGBA")
+    custom_sprite = Image.effect_noise((FLY_SIDE, FLY_SIDE), 80).convert("RGBA")
+
+    print(f"open templates:       {best(open_templates, 10):8.3f}ms")
+    print(f"load default atlas:   {best(SpriteAtlas.load_default, 10):8.3f}ms")
+    print(f"rotate custom sprite: {best(lambda: SpriteAtlas.from_image(custom_sprite), 10):8.3f}ms")
+    print()
+
+    for fly_src in (None, custom_sprite):
+        for amount in (1, 10, 50):
+            drawer = FlyDrawer(background, amount, 10, steps=STEPS, fly_src=fly_src)
+
+            def frames(drawer: FlyDrawer = drawer) -> None:
+                drawer._previous_boxes = None
+
+                for step in range(drawer.steps):
+                    frame, _ = drawer.make_frame(step)
+                    frame.close()
+
+            sprites = "default" if fly_src is None else "custom"
+            per_frame = best(frames, 1) / STEPS
+
+            print(f"{sprites:>7} sprites, {amount:2} flies: {per_frame:8.3f}ms per frame")
+
+
+if __name__ == "__main__":
+    main()
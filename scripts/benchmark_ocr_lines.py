@@ -0,0 +1,81 @@
+# compares grouping OCR words into lines with old word matching loop on dense synthetic annotations, run from
+# repository root with:
+#   uv run python -m scripts.benchmark_ocr_lines [annotation.json ...]
+# arguments are saved API responses, without them synthetic chat log sized annotations are used
+
+import sys
+import timeit
+
+from pathlib import Path
+from typing import Any
+
+from scripts.ocr_standin import load_payload, synthetic_annotation
+from src.cogs.images.ocr_lines import annotation_lines
+
+REPEAT = 5
+
+# (width, height, font size)
+SYNTHETIC_SIZES = (
+    (1024, 768, 24),
+    (1080, 2400, 14),
+    (1920, 8000, 12),
+)
+
+
+def legacy_lines(annotations: dict[str, Any]) -> list[list[Any]]:
+    # loop trocr and textboxes used before ocr_lines
+    word_annotations = annotations["textAnnotations"][1:]
+    lines = annotations["fullTextAnnotation"]["text"].rstrip("\n").split("\n")
+
+    current_word = 0
+    result = []
+
+    for line in lines:
+        words = []
+        remaining_line = line
+
+        for word in word_annotations[current_word:]:
+            text = word["description"]
+            if remaining_line.startswith(text):
+                current_word += 1
+                remaining_line = remaining_line[len(text) :].lstrip()
+                words.append(word["boundingPoly"]["vertices"])
+            else:
+                break
+
+        result.append(words)
+
+    return result
+
+
+def best(fn: Any) -> float:
+    """Best time of single call in milliseconds"""
+
+    return min(timeit.repeat(fn, number=1, repeat=REPEAT)) * 1000
+
+
+def samples() -> dict[str, dict[str, Any]]:
+    if len(sys.argv) > 1:
+        return {path: load_payload(Path(path)) for path in sys.argv[1:]}
+
+    return {
+        f"{width}x{height}": synthetic_annotation(width, height, font_size=font_size)
+        for width, height, font_size in SYNTHETIC_SIZES
+    }
+
+
+def main() -> None:
+    print(f"{'annotation':>12} {'words':>6} {'lines':>5} {'legacy':>10} {'single pass':>12}")
+
+    for name, annotations in samples().items():
+        lines = annotation_lines(annotations)
+        words = sum(len(line.words) for line in lines)
+
+        legacy = best(lambda annotations=annotations: legacy_lines(annotations))
+        single_pass = best(lambda annotations=annotations: annotation_lines(annotations))
+
+        print(f"{name:>12} {words:>6} {len(lines):>5} {legacy:>8.2f}ms {single_pass:>10.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# compares translating multi-line text in one request with chunked concurrent translation against local stand-in,
+# run from repository root with:
+#   uv run python -m scripts.benchmark_translate
+# stand-in latency grows with text length like real API does, cache is not involved
+
+import asyncio
+import random
+import time
+
+import aiohttp
+
+from aiohttp import web
+
+from scripts.translate_standin import CHARS, MAX_CHARS, REQUESTS, make_app
+from src.cogs.translator.backend import GoogleTranslateBackend
+from src.cogs.translator.planner import translate_lines
+
+PORT = 8096
+LATENCY = 0.1
+PER_CHAR_LATENCY = 0.0002
+
+CHUNK_SIZE = 1000
+CONCURRENCY = 4
+
+WORDS = ("the", "quick", "brown", "fox", "jumps", "over", "lazy", "dog", "lorem", "ipsum", "dolor", "sit", "amet")
+
+# (line count, share of repeated lines)
+SAMPLES = (
+    (20, 0.0),
+    (100, 0.3),
+    (400, 0.3),
+)
+
+
+def sample_lines(count: int, repeated: float, *, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    lines: list[str] = []
+
+    for _ in range(count):
+        if lines and rng.random() < repeated:
+            lines.append(rng.choice(lines))
+        else:
+            lines.append(" ".join(rng.choices(WORDS, k=rng.randint(2, 12))))
+
+    return lines
+
+
+async def main() -> None:
+    app = make_app(latency=LATENCY, per_char_latency=PER_CHAR_LATENCY)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", PORT).start()
+
+    backend = GoogleTranslateBackend(f"http://127.0.0.1:{PORT}/translate_a/single", timeout=60)
+
+    print(f"{'lines':>5} {'chars':>6} {'single':>10} {'chunked':>10} {'requests':>8} {'sent':>6}")
+
+    try:
+        async with aiohttp.ClientSession() as session:
+
+            async def translate(text: str) -> dict[str, str]:
+                return await backend.translate(session, text, "de")
+
+            for count, repeated in SAMPLES:
+                lines = sample_lines(count, repeated)
+                text = "\n".join(lines)
+
+                if len(text) > MAX_CHARS:
+                    single = "too long"
+                else:
+                    started = time.perf_counter()
+                    await translate(text)
+                    single = f"{(time.perf_counter() - started) * 1000:.0f}ms"
+
+                requests, chars = app[REQUESTS], app[CHARS]
+
+                started = time.perf_counter()
+                await translate_lines(translate, lines, max_chars=CHUNK_SIZE, concurrency=CONCURRENCY)
+                chunked = (time.perf_counter() - started) * 1000
+
+                requests, chars = app[REQUESTS] - requests, app[CHARS] - chars
+
+                print(f"{count:>5} {len(text):>6} {single:>10} {chunked:>8.0f}ms {requests:>8} {chars:>6}")
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,140 @@
+# measures end-to-end trocr throughput against local OCR stand-in, run from repository root with:
+#   uv run python -m scripts.benchmark_trocr [--images 32] [--latency 0.5] [--rate 60] [--workers 4]
+# OCR queue, annotation parsing and drawing are real, text is changed by local accent instead of translator
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from io import BytesIO
+from typing import Any, Optional, cast
+
+import aiohttp
+
+from aiohttp import web
+from PIL import Image
+from pink_accents import Accent
+
+from scripts.ocr_standin import IMAGES, REQUESTS, make_app
+from src.cogs.images.ocr import _ocr_queue as ocr_queue, ocr_translate
+from src.cogs.images.ocr_backend import VisionAPIBackend
+from src.cogs.images.ocr_queue import TokenBucket
+from src.cogs.images.pool import start_pool, stop_pool
+from src.cogs.images.scheduler import render_scheduler
+from src.cogs.images.types import ImageType, StaticImage
+from src.context import Context
+
+
+class Reversed(Accent):
+    """txet desrever"""
+
+    PATTERNS = {  # noqa: RUF012
+        r"[a-z]+": lambda m: m.original[::-1],
+    }
+
+
+class _Accents:
+    @staticmethod
+    def apply_accents_to_text(content: str, accents: list[Accent]) -> str:
+        for accent in accents:
+            content = accent.apply(content)
+
+        return content.strip()
+
+
+class _Bot:
+    def __init__(self, loop: asyncio.AbstractEventLoop, session: aiohttp.ClientSession):
+        self.loop = loop
+        self.session = session
+
+    def get_cog(self, name: str) -> Optional[object]:
+        return _Accents() if name == "Accents" else None
+
+
+class _Context:
+    guild = None
+
+    def __init__(self, bot: _Bot):
+        self.bot = bot
+        self.session = bot.session
+
+    async def reply(self, *_args: Any, **_kwargs: Any) -> None:
+        pass
+
+
+def sample_image(size: tuple[int, int]) -> bytes:
+    result = BytesIO()
+    Image.effect_noise(size, 60).convert("RGB").save(result, format="PNG")
+
+    return result.getvalue()
+
+
+async def run(args: argparse.Namespace) -> None:
+    app = make_app(latency=args.latency, per_image_latency=args.per_image_latency)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+
+    host, port = runner.addresses[0][:2]
+    url = f"http://{host}:{port}/v1/images:annotate"
+
+    if args.workers:
+        await start_pool(args.workers)
+
+    width, height = map(int, args.size.split("x"))
+    images = [
+        StaticImage(ImageType.URL, f"http://standin/{i}.png", data=sample_image((width, height)))
+        for i in range(args.images)
+    ]
+
+    async with aiohttp.ClientSession() as session:
+        ocr_queue.backend = VisionAPIBackend(url, "standin")
+        ocr_queue.bucket = TokenBucket(args.rate / 60, args.burst)
+        ocr_queue.maxsize = args.images
+        render_scheduler.max_queued = args.images
+
+        ctx = cast(Context, _Context(_Bot(asyncio.get_running_loop(), session)))
+        accent = Reversed()
+
+        latencies = []
+
+        async def command(image: StaticImage) -> None:
+            start = time.perf_counter()
+            await ocr_translate(ctx, image, accent)
+            latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(command(image) for image in images))
+        elapsed = time.perf_counter() - start
+
+        ocr_queue.close()
+
+    stop_pool()
+    await runner.cleanup()
+
+    latencies.sort()
+
+    print(f"images:       {args.images} {width}x{height}, {args.workers or 'no'} workers")
+    print(f"api calls:    {app[REQUESTS]} ({app[IMAGES] / app[REQUESTS]:.1f} images per call)")
+    print(f"total:        {elapsed:.2f}s, {args.images / elapsed:.2f} images/s")
+    print(f"latency p50:  {statistics.median(latencies):.3f}s")
+    print(f"latency p95:  {latencies[int(len(latencies) * 0.95) - 1]:.3f}s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="trocr pipeline benchmark")
+    parser.add_argument("--images", type=int, default=32, help="trocr commands started at once")
+    parser.add_argument("--size", default="1024x768", help="image size, WIDTHxHEIGHT")
+    parser.add_argument("--latency", type=float, default=0.3, help="stand-in seconds per request")
+    parser.add_argument("--per-image-latency", type=float, default=0.05, help="stand-in seconds per image")
+    parser.add_argument("--rate", type=float, default=60, help="OCR API calls per minute")
+    parser.add_argument("--burst", type=int, default=1, help="OCR API calls allowed at once")
+    parser.add_argument("--workers", type=int, default=0, help="render process pool size, 0 renders in threads")
+
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
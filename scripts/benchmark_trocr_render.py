@@ -0,0 +1,62 @@
+# measures trocr drawing time on synthetic annotations, run from repository root with:
+#   uv run python -m scripts.benchmark_trocr_render [image ...]
+# without arguments noise images are used
+
+import sys
+import timeit
+
+from PIL import Image
+
+from scripts.ocr_standin import synthetic_annotation
+from src.cogs.images.ocr import TextField, _draw_trocr, _line_fields
+from src.cogs.images.ocr_lines import annotation_lines
+
+REPEAT = 3
+
+# (width, height, font size), smaller font means more fields
+SYNTHETIC_SIZES = (
+    (800, 600, 32),
+    (1024, 768, 16),
+    (1920, 1080, 12),
+)
+
+
+def sample_fields(src: Image.Image, font_size: int) -> list[TextField]:
+    lines = annotation_lines(synthetic_annotation(*src.size, font_size=font_size))
+    fields, _ = _line_fields(src, lines, [line.text[::-1] for line in lines])
+
+    return [field for field in fields if field is not None]
+
+
+def samples() -> list[tuple[str, Image.Image, int]]:
+    if len(sys.argv) > 1:
+        result: list[tuple[str, Image.Image, int]] = []
+        for path in sys.argv[1:]:
+            with Image.open(path) as img:
+                result.extend((path, img.convert("RGB"), font_size) for _, _, font_size in SYNTHETIC_SIZES)
+
+        return result
+
+    return [
+        (f"{width}x{height}", Image.effect_noise((width, height), 60).convert("RGB"), font_size)
+        for width, height, font_size in SYNTHETIC_SIZES
+    ]
+
+
+def main() -> None:
+    print(f"{'image':>12} {'fields':>6} {'draw':>10} {'size':>8}")
+
+    for name, src, font_size in samples():
+        fields = sample_fields(src, font_size)
+
+        def draw(src: Image.Image = src, fields: list[TextField] = fields) -> None:
+            _draw_trocr(src, fields)
+
+        elapsed = min(timeit.repeat(draw, number=1, repeat=REPEAT))
+        result = _draw_trocr(src, fields)
+
+        print(f"{name:>12} {min(len(fields), 150):>6} {elapsed * 1000:>8.0f}ms {len(result) / 1024:>6.0f}KB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+# local stand-in for Google Vision images:annotate, run from repository root with:
+#   uv run python -m scripts.ocr_standin [--latency 0.5] [--payload response.json]
+# and point bot to it with ocr_api_url = "http://127.0.0.1:8085/v1/images:annotate" in cog.images settings
+#
+# without payload every image gets synthetic text covering it, payload can be saved API response or single annotation
+
+import argparse
+import asyncio
+import base64
+import io
+import random
+import zlib
+
+from pathlib import Path
+from typing import Any, Optional
+
+import orjson
+
+from aiohttp import web
+from PIL import Image
+
+# API limit
+MAX_IMAGES = 16
+
+WORDS = (
+    "the",
+    "quick",
+    "brown",
+    "fox",
+    "jumps",
+    "over",
+    "lazy",
+    "dog",
+    "lorem",
+    "ipsum",
+    "dolor",
+    "sit",
+    "amet",
+    "when",
+    "you",
+    "see",
+    "it",
+    "meme",
+    "text",
+    "bottom",
+)
+LINES_PER_PARAGRAPH = 4
+
+# served request and image counters
+REQUESTS = web.AppKey("requests", int)
+IMAGES = web.AppKey("images", int)
+
+
+def _box(left: int, top: int, right: int, bottom: int) -> dict[str, Any]:
+    return {
+        "vertices": [
+            {"x": left, "y": top},
+            {"x": right, "y": top},
+            {"x": right, "y": bottom},
+            {"x": left, "y": bottom},
+        ]
+    }
+
+
+def synthetic_annotation(width: int, height: int, *, seed: int = 0, font_size: Optional[int] = None) -> dict[str, Any]:
+    """Lines of random words filling image, in the same shape as real TEXT_DETECTION response"""
+
+    rng = random.Random(seed)
+
+    if font_size is None:
+        font_size = max(12, min(40, height // 20))
+
+    char_width = max(1, font_size * 11 // 20)
+    line_height = font_size * 3 // 2
+    margin = font_size // 2
+
+    word_annotations: list[dict[str, Any]] = []
+    paragraphs: list[dict[str, Any]] = []
+    lines: list[str] = []
+
+    top = margin
+    while top + font_size <= height - margin:
+        line_words: list[tuple[str, tuple[int, int, int, int]]] = []
+
+        left = margin
+        while True:
+            text = rng.choice(WORDS)
+            right = left + len(text) * char_width
+            if right > width - margin:
+                break
+
+            line_words.append((text, (left, top, right, top + font_size)))
+            left = right + char_width
+
+        if not line_words:
+            break
+
+        if len(lines) % LINES_PER_PARAGRAPH == 0:
+            paragraphs.append({"words": []})
+
+        paragraph_end = len(lines) % LINES_PER_PARAGRAPH == LINES_PER_PARAGRAPH - 1
+
+        for i, (text, box) in enumerate(line_words):
+            if i != len(line_words) - 1:
+                detected_break = "SPACE"
+            elif paragraph_end:
+                detected_break = "LINE_BREAK"
+            else:
+                detected_break = "EOL_SURE_SPACE"
+
+            symbols: list[dict[str, Any]] = [{"text": c} for c in text]
+            symbols[-1]["property"] = {"detectedBreak": {"type": detected_break}}
+
+            word_annotations.append({"description": text, "boundingPoly": _box(*box)})
+            paragraphs[-1]["words"].append({"boundingBox": _box(*box), "symbols": symbols})
+
+        lines.append(" ".join(text for text, _ in line_words))
+        top += line_height
+
+    if not lines:
+        return {}
+
+    text = "\n".join(lines) + "\n"
+
+    return {
+        "textAnnotations": [
+            {"locale": "en", "description": text, "boundingPoly": _box(0, 0, width, height)},
+            *word_annotations,
+        ],
+        "fullTextAnnotation": {
+            "pages": [
+                {
+                    "width": width,
+                    "height": height,
+                    "blocks": [{"blockType": "TEXT", "paragraphs": [paragraph]} for paragraph in paragraphs],
+                }
+            ],
+            "text": text,
+        },
+    }
+
+
+def load_payload(path: Path) -> dict[str, Any]:
+    data = orjson.loads(path.read_bytes())
+
+    # full saved response
+    if "responses" in data:
+        return data["responses"][0]
+
+    return data
+
+
+def make_app(
+    *, latency: float = 0, per_image_latency: float = 0, payload: Optional[dict[str, Any]] = None
+) -> web.Application:
+    async def annotate(request: web.Request) -> web.Response:
+        body = await request.json(loads=orjson.loads)
+        requests = body.get("requests", [])
+
+        if not requests:
+            return web.json_response({"message": "no requests"}, status=400)
+
+        if len(requests) > MAX_IMAGES:
+            return web.json_response({"message": f"at most {MAX_IMAGES} images per request"}, status=400)
+
+        await asyncio.sleep(latency + per_image_latency * len(requests))
+
+        responses = []
+        for item in requests:
+            if payload is not None:
+                responses.append(payload)
+
+                continue
+
+            image_bytes = base64.b64decode(item["image"]["content"])
+            try:
+                with Image.open(io.BytesIO(image_bytes)) as img:
+                    size = img.size
+            except OSError as e:
+                responses.append({"error": {"code": 3, "message": f"Bad image data: {e}"}})
+
+                continue
+
+            responses.append(synthetic_annotation(*size, seed=zlib.crc32(image_bytes)))
+
+        request.app[REQUESTS] += 1
+        request.app[IMAGES] += len(requests)
+
+        return web.Response(body=orjson.dumps({"responses": responses}), content_type="application/json")
+
+    app = web.Application(client_max_size=16 * 1024 * 1024)
+    app[REQUESTS] = 0
+    app[IMAGES] = 0
+    app.router.add_post("/v1/images:annotate", annotate)
+
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Vision API stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8085)
+    parser.add_argument("--latency", type=float, default=0, help="seconds added to every request")
+    parser.add_argument("--per-image-latency", type=float, default=0, help="seconds added for every image in request")
+    parser.add_argument("--payload", type=Path, help="saved response returned for every image")
+
+    args = parser.parse_args()
+
+    app = make_app(
+        latency=args.latency,
+        per_image_latency=args.per_image_latency,
+        payload=None if args.payload is None else load_payload(args.payload),
+    )
+
+    web.run_app(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
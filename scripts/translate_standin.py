@@ -0,0 +1,63 @@
+# local stand-in for Google Translate gtx endpoint, run from repository root with:
+#   uv run python -m scripts.translate_standin [--latency 0.2]
+# and point bot to it with translate_api_url = "http://127.0.0.1:8086/translate_a/single" in cog.translator settings
+#
+# every line is "translated" by reversing it, detected language is always english
+
+import argparse
+import asyncio
+
+from aiohttp import web
+
+# roughly what real endpoint accepts
+MAX_CHARS = 5000
+
+REQUESTS = web.AppKey("requests", int)
+CHARS = web.AppKey("chars", int)
+
+
+def make_app(*, latency: float = 0, per_char_latency: float = 0) -> web.Application:
+    async def translate(request: web.Request) -> web.Response:
+        form = await request.post()
+        text = request.query.get("q") or form.get("q")
+
+        if not isinstance(text, str) or "tl" not in request.query:
+            return web.Response(status=400, text="q and tl are required")
+
+        if len(text) > MAX_CHARS:
+            return web.Response(status=413, text=f"at most {MAX_CHARS} characters per request")
+
+        await asyncio.sleep(latency + per_char_latency * len(text))
+
+        request.app[REQUESTS] += 1
+        request.app[CHARS] += len(text)
+
+        # real API returns sentences as separate parts with their trailing whitespace
+        lines = text.split("\n")
+        ends = ["\n"] * (len(lines) - 1) + [""]
+        parts = [[line[::-1] + end, line + end, None, None, 10] for line, end in zip(lines, ends, strict=True)]
+
+        return web.json_response([parts, None, "en", None, None, None, 1.0, [], [["en"], None, [1.0], ["en"]]])
+
+    app = web.Application()
+    app[REQUESTS] = 0
+    app[CHARS] = 0
+    app.router.add_route("*", "/translate_a/single", translate)
+
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Google Translate stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8086)
+    parser.add_argument("--latency", type=float, default=0, help="seconds added to every request")
+    parser.add_argument("--per-char-latency", type=float, default=0, help="seconds added for every character")
+
+    args = parser.parse_args()
+
+    web.run_app(make_app(latency=args.latency, per_char_latency=args.per_char_latency), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
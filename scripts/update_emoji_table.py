@@ -0,0 +1,23 @@
+# regenerates src/cogs/images/emoji_sequences.txt from emoji package data, run with:
+#   uv run --with emoji python scripts/update_emoji_table.py
+
+from pathlib import Path
+
+import emoji  # type: ignore
+
+TABLE_PATH = Path("src") / "cogs" / "images" / "emoji_sequences.txt"
+
+
+def main() -> None:
+    # variation selector is optional in user input and is stripped before lookup
+    sequences = {"-".join(f"{ord(c):x}" for c in e.replace("\N{VARIATION SELECTOR-16}", "")) for e in emoji.EMOJI_DATA}
+
+    with TABLE_PATH.open("w") as f:
+        f.write(f"# generated by scripts/update_emoji_table.py from emoji {emoji.__version__}\n")
+        f.writelines(f"{sequence}\n" for sequence in sorted(sequences))
+
+    print("wrote", len(sequences), "sequences to", TABLE_PATH)
+
+
+if __name__ == "__main__":
+    main()
@@ -17,6 +17,7 @@ import sentry_sdk
 from discord.ext import commands
 from redis.asyncio import Redis
 
+from src.cache import TieredCache
 from src.context import Context
 from src.settings import settings
 from src.version import Version
@@ -85,6 +86,8 @@ class PINK(commands.Bot):
         self.redis = redis
         self.version = version
 
+        TieredCache.connect(redis)
+
         self.prefixes: dict[int, Prefix] = {}
         self.owner_ids: set[int] = set()
 
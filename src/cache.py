@@ -1,21 +1,408 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import sys
+import time
+
 from collections import OrderedDict
-from typing import Any
+from collections.abc import Awaitable, Callable, Hashable, Iterator
+from functools import partial
+from typing import Any, ClassVar, Generic, Optional, TypeVar, cast, overload
+
+import orjson
+
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+__all__ = (
+    "Cache",
+    "CacheStats",
+    "TieredCache",
+)
+
+log = logging.getLogger(__name__)
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+T = TypeVar("T")
+
+
+class CacheStats:
+    __slots__ = (
+        "hits",
+        "misses",
+        "coalesced",
+        "evictions",
+        "expirations",
+    )
+
+    def __init__(self) -> None:
+        self.hits = 0
+        self.misses = 0
+        # concurrent misses that waited for another caller to compute value
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        if not (total := self.hits + self.misses):
+            return 0.0
+
+        return self.hits / total
+
+    def __repr__(self) -> str:
+        return (
+            f"<{type(self).__name__} hits={self.hits} misses={self.misses} coalesced={self.coalesced} "
+            f"evictions={self.evictions} expirations={self.expirations}>"
+        )
 
-__all__ = ("LRU",)
 
+class _Entry(Generic[V]):
+    __slots__ = (
+        "value",
+        "expires_at",
+        "size",
+    )
 
-# https://docs.python.org/3/library/collections.html#ordereddict-examples-and-recipes
-class LRU(OrderedDict[Any, Any]):
-    def __init__(self, maxsize: int = 128, /, *args: Any, **kwds: Any):
+    def __init__(self, value: V, expires_at: Optional[float], size: int):
+        self.value = value
+        self.expires_at = expires_at
+        self.size = size
+
+    def expired(self, now: float) -> bool:
+        return self.expires_at is not None and self.expires_at <= now
+
+
+class Cache(Generic[K, V]):
+    """
+    LRU cache with optional TTL and entry count/estimated size limits.
+
+    Size of each value is estimated with `sizeof` callable, sys.getsizeof by default. This is shallow and only makes
+    sense for flat values like bytes, pass something better for containers.
+
+    Not thread safe. Async get_or_compute deduplicates concurrent misses: only one factory runs per key, everyone else
+    waits for its result.
+    """
+
+    __slots__ = (
+        "maxsize",
+        "max_bytes",
+        "ttl",
+        "stats",
+        "size_bytes",
+        "_sizeof",
+        "_data",
+        "_pending",
+    )
+
+    def __init__(
+        self,
+        maxsize: Optional[int] = 128,
+        /,
+        *,
+        max_bytes: Optional[int] = None,
+        ttl: Optional[float] = None,
+        sizeof: Callable[[V], int] = sys.getsizeof,
+    ):
         self.maxsize = maxsize
-        super().__init__(*args, **kwds)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+        self.stats = CacheStats()
+        self.size_bytes = 0
+
+        self._sizeof = sizeof
+        self._data: OrderedDict[K, _Entry[V]] = OrderedDict()
+        self._pending: dict[K, asyncio.Future[V]] = {}
+
+    def _lookup(self, key: K) -> Optional[_Entry[V]]:
+        if (entry := self._data.get(key)) is None:
+            return None
+
+        if entry.expired(time.monotonic()):
+            self._remove(key)
+            self.stats.expirations += 1
+
+            return None
+
+        self._data.move_to_end(key)
+
+        return entry
+
+    def _remove(self, key: K) -> _Entry[V]:
+        entry = self._data.pop(key)
+        self.size_bytes -= entry.size
+
+        return entry
+
+    def _shrink(self) -> None:
+        now = time.monotonic()
+
+        while self._data and (
+            (self.maxsize is not None and len(self._data) > self.maxsize)
+            or (self.max_bytes is not None and self.size_bytes > self.max_bytes)
+        ):
+            oldest = next(iter(self._data))
+
+            if self._remove(oldest).expired(now):
+                self.stats.expirations += 1
+            else:
+                self.stats.evictions += 1
+
+    @overload
+    def get(self, key: K) -> Optional[V]: ...
+
+    @overload
+    def get(self, key: K, default: T) -> V | T: ...
+
+    def get(self, key: K, default: Any = None) -> Any:
+        if (entry := self._lookup(key)) is None:
+            self.stats.misses += 1
+
+            return default
+
+        self.stats.hits += 1
+
+        return entry.value
+
+    def set(self, key: K, value: V, *, ttl: Optional[float] = None) -> None:
+        if ttl is None:
+            ttl = self.ttl
+
+        if key in self._data:
+            self._remove(key)
+
+        size = self._sizeof(value) if self.max_bytes is not None else 0
+
+        # value does not fit at all, do not flush entire cache for it
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+
+        self._data[key] = _Entry(value, None if ttl is None else time.monotonic() + ttl, size)
+        self.size_bytes += size
+
+        self._shrink()
+
+    @overload
+    def pop(self, key: K) -> Optional[V]: ...
+
+    @overload
+    def pop(self, key: K, default: T) -> V | T: ...
+
+    def pop(self, key: K, default: Any = None) -> Any:
+        if self._lookup(key) is None:
+            return default
+
+        return self._remove(key).value
+
+    def clear(self) -> None:
+        self._data.clear()
+        self.size_bytes = 0
+
+    def values(self) -> Iterator[V]:
+        """Iterate over values including expired ones. Does not affect LRU order"""
+
+        return (entry.value for entry in self._data.values())
+
+    async def get_or_compute(
+        self,
+        key: K,
+        factory: Callable[[], Awaitable[V]],
+        *,
+        ttl: Optional[float] = None,
+    ) -> V:
+        """Get value or compute it using factory. Concurrent calls for the same key share single factory call"""
+
+        while (entry := self._lookup(key)) is None:
+            if (pending := self._pending.get(key)) is None:
+                break
+
+            self.stats.coalesced += 1
+
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                # whoever was computing value got cancelled, try again ourselves
+                if pending.cancelled():
+                    continue
+
+                raise
+        else:
+            self.stats.hits += 1
+
+            return entry.value
+
+        self.stats.misses += 1
+
+        fut = asyncio.get_running_loop().create_future()
+        self._pending[key] = fut
+
+        try:
+            value = await factory()
+        except asyncio.CancelledError:
+            fut.cancel()
+
+            raise
+        except Exception as e:
+            fut.set_exception(e)
+            # mark exception as retrieved, otherwise asyncio complains about it if nobody waited for it
+            fut.exception()
+
+            raise
+        finally:
+            del self._pending[key]
+
+        self.set(key, value, ttl=ttl)
+        fut.set_result(value)
+
+        return value
+
+    def __getitem__(self, key: K) -> V:
+        if (entry := self._lookup(key)) is None:
+            self.stats.misses += 1
+
+            raise KeyError(key)
+
+        self.stats.hits += 1
+
+        return entry.value
+
+    def __setitem__(self, key: K, value: V) -> None:
+        self.set(key, value)
+
+    def __delitem__(self, key: K) -> None:
+        self._remove(key)
+
+    def __contains__(self, key: K) -> bool:
+        return (entry := self._data.get(key)) is not None and not entry.expired(time.monotonic())
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __repr__(self) -> str:
+        return (
+            f"<{type(self).__name__} len={len(self)} maxsize={self.maxsize} size_bytes={self.size_bytes} "
+            f"max_bytes={self.max_bytes} ttl={self.ttl} stats={self.stats}>"
+        )
+
+
+class TieredCache(Generic[V]):
+    """
+    Two level cache: process memory first, redis second. Values are stored in redis using orjson and must be
+    serializable by it.
+
+    Redis connection is shared between all instances and is set by bot on startup using TieredCache.connect. Without
+    connection or if redis is unavailable this degrades to memory only cache.
+
+    Concurrent misses are deduplicated by memory level, so only one redis lookup and factory call happen per key.
+    """
+
+    _redis: ClassVar[Optional[Redis[bytes]]] = None
+
+    __slots__ = (
+        "namespace",
+        "ttl",
+        "memory",
+        "redis_stats",
+    )
+
+    def __init__(
+        self,
+        namespace: str,
+        *,
+        ttl: float,
+        maxsize: int = 128,
+        max_bytes: Optional[int] = None,
+        sizeof: Callable[[V], int] = sys.getsizeof,
+    ):
+        self.namespace = namespace
+        self.ttl = ttl
+
+        self.memory: Cache[str, V] = Cache(maxsize, max_bytes=max_bytes, ttl=ttl, sizeof=sizeof)
+        self.redis_stats = CacheStats()
+
+    @classmethod
+    def connect(cls, redis: Optional[Redis[bytes]]) -> None:
+        cls._redis = redis
+
+    def _redis_key(self, key: str) -> str:
+        # keys can be anything including long user input, hash them
+        return f"cache:{self.namespace}:{hashlib.sha256(key.encode()).hexdigest()}"
+
+    async def _redis_get(self, key: str) -> Optional[V]:
+        if (redis := self._redis) is None:
+            return None
+
+        redis_key = self._redis_key(key)
+
+        try:
+            data = await redis.get(redis_key)
+        except (RedisError, OSError) as e:
+            log.warning("redis get %s: %s: %s", self.namespace, type(e).__name__, e)
+
+            return None
+
+        if data is None:
+            self.redis_stats.misses += 1
+
+            return None
+
+        try:
+            value = orjson.loads(data)
+        except orjson.JSONDecodeError as e:
+            # corrupt or written by older version, treat as miss so that value is computed again
+            log.warning("redis get %s: bad value: %s", self.namespace, e)
+            self.redis_stats.misses += 1
+
+            try:
+                await redis.delete(redis_key)
+            except (RedisError, OSError) as e:
+                log.warning("redis delete %s: %s: %s", self.namespace, type(e).__name__, e)
+
+            return None
+
+        self.redis_stats.hits += 1
+
+        return cast(V, value)
+
+    async def _redis_set(self, key: str, value: V) -> None:
+        if (redis := self._redis) is None:
+            return
+
+        try:
+            await redis.set(self._redis_key(key), orjson.dumps(value), px=int(self.ttl * 1000))
+        except (RedisError, OSError) as e:
+            log.warning("redis set %s: %s: %s", self.namespace, type(e).__name__, e)
+
+    async def get(self, key: str) -> Optional[V]:
+        if (value := self.memory.get(key)) is not None:
+            return value
+
+        if (value := await self._redis_get(key)) is not None:
+            self.memory.set(key, value)
+
+        return value
+
+    async def set(self, key: str, value: V) -> None:
+        self.memory.set(key, value)
+
+        await self._redis_set(key, value)
+
+    async def _redis_get_or_compute(self, key: str, factory: Callable[[], Awaitable[V]]) -> V:
+        if (value := await self._redis_get(key)) is not None:
+            return value
+
+        value = await factory()
+
+        await self._redis_set(key, value)
 
-    def __setitem__(self, key: Any, value: Any) -> None:
-        if key in self:
-            self.move_to_end(key)
+        return value
 
-        super().__setitem__(key, value)
+    async def get_or_compute(self, key: str, factory: Callable[[], Awaitable[V]]) -> V:
+        return await self.memory.get_or_compute(key, partial(self._redis_get_or_compute, key, factory))
 
-        if len(self) > self.maxsize:
-            oldest = next(iter(self))
-            del self[oldest]
+    def __repr__(self) -> str:
+        return f"<{type(self).__name__} namespace={self.namespace} memory={self.memory} redis={self.redis_stats}>"
@@ -16,7 +16,7 @@ from discord.ext import commands
 from pink_accents import Accent
 
 from src.bot import PINK
-from src.cache import LRU
+from src.cache import Cache
 from src.cog import Cog
 from src.context import Context
 from src.converters import Code
@@ -44,7 +44,7 @@ class Accents(Cog, HookHost):
         super().__init__(bot)
 
         # channel_id -> Webhook
-        self._webhooks = LRU(64)
+        self._webhooks: Cache[int, discord.Webhook] = Cache(64)
 
         # guild_id -> user_id -> [Accent]
         self._accents: dict[int, dict[int, list[Accent]]] = {}
@@ -53,7 +53,7 @@ class Accents(Cog, HookHost):
         # used for fighting back against discord embed message edits:
         # user sends text message -> discord queues embed creation in background -> edits message on success
         # this triggers accents twice. cached message ids are used to edit original response
-        self._sent_webhook_messages = LRU(64)
+        self._sent_webhook_messages: Cache[int, discord.WebhookMessage] = Cache(64)
 
     async def cog_load(self) -> None:
         # TODO: perform cleanup in case name format or bot name ever changes?
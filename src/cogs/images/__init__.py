@@ -1,3 +1,4 @@
+from io import BytesIO
 from typing import Optional
 
 import discord
@@ -5,13 +6,16 @@ import discord
 from discord.ext import commands
 
 from src.bot import PINK
+from src.checks import is_owner
 from src.cog import Cog
 from src.context import Context
-from src.utils import run_process
 
-from .constants import GIFSICLE_ARGUMENTS
-from .flies import draw_flies
-from .types import AnimatedImage, Image, StaticImage
+from .animation import DEFAULT_FORMATS, AnimationFormat
+from .flies import FLY_SIDE, MAX_SIDE, draw_flies
+from .pool import start_pool, stop_pool
+from .scheduler import render_scheduler, schedule
+from .settings import cog_settings
+from .types import AnimatedImage, Image, StaticImage, image_history
 
 try:
     from src.cogs.translator.types import Language
@@ -25,7 +29,7 @@ except ImportError:
 
 from pink_accents import Accent
 
-from .ocr import ocr, ocr_translate, textboxes
+from .ocr import close_ocr_queue, ocr, ocr_translate, textboxes
 
 _StrOrAccent = str | Accent
 
@@ -45,6 +49,21 @@ class LanguageOrAccent(commands.Converter[_StrOrAccent]):
         return language
 
 
+class AnimationFormatConverter:
+    @classmethod
+    async def convert(cls, _: Context, argument: str) -> AnimationFormat:
+        try:
+            return AnimationFormat(argument.lower())
+        except ValueError:
+            raise commands.BadArgument(
+                f"unknown format, expected one of **{', '.join(f.value for f in AnimationFormat)}**"
+            ) from None
+
+
+class AnimationFlags(commands.FlagConverter, delimiter=" ", prefix="--"):
+    output: Optional[AnimationFormat] = commands.flag(name="format", converter=AnimationFormatConverter)
+
+
 class Images(Cog):
     """
     Image manipulation
@@ -70,6 +89,62 @@ class Images(Cog):
         be stacked. each ^ means go 1 message back in history
     """
 
+    async def cog_load(self) -> None:
+        if cog_settings.process_pool_workers:
+            await start_pool(cog_settings.process_pool_workers)
+
+    async def cog_unload(self) -> None:
+        image_history.clear()
+        stop_pool()
+        close_ocr_queue()
+
+    @Cog.listener()
+    async def on_ready(self) -> None:
+        # new gateway session, events could have been missed
+        image_history.clear()
+
+    @Cog.listener()
+    async def on_message(self, message: discord.Message) -> None:
+        image_history.add(message)
+
+    @Cog.listener()
+    async def on_message_edit(self, _before: discord.Message, after: discord.Message) -> None:
+        image_history.update(after)
+
+    @Cog.listener()
+    async def on_raw_message_edit(self, payload: discord.RawMessageUpdateEvent) -> None:
+        # cached messages are handled by on_message_edit. others drop out of discord.py cache long before they leave
+        # index, but embeds can still be added to them
+        if payload.cached_message is not None:
+            return
+
+        if not image_history.tracks(payload.channel_id, payload.message_id):
+            return
+
+        # partial updates cannot be turned into message
+        if "author" not in payload.data:
+            return
+
+        channel = self.bot.get_channel(payload.channel_id) or self.bot.get_partial_messageable(
+            payload.channel_id, guild_id=payload.guild_id
+        )
+
+        image_history.update(
+            discord.Message(
+                state=self.bot._connection,
+                channel=channel,  # type: ignore[arg-type]
+                data=payload.data,
+            )
+        )
+
+    @Cog.listener()
+    async def on_raw_message_delete(self, payload: discord.RawMessageDeleteEvent) -> None:
+        image_history.remove(payload.channel_id, (payload.message_id,))
+
+    @Cog.listener()
+    async def on_raw_bulk_message_delete(self, payload: discord.RawBulkMessageDeleteEvent) -> None:
+        image_history.remove(payload.channel_id, payload.message_ids)
+
     @commands.command(hidden=True)
     async def i(
         self,
@@ -103,6 +178,20 @@ class Images(Cog):
 
         await ctx.send(i, accents=[])
 
+    @commands.command(hidden=True)
+    @is_owner()
+    async def renders(self, ctx: Context) -> None:
+        """Show render queue stats"""
+
+        scheduler = render_scheduler
+        stats = scheduler.stats
+
+        await ctx.send(
+            f"```\nslots {scheduler.concurrency} queue limit {scheduler.max_queued}\n"
+            f"queued {stats.queued:<3} active {stats.active:<2} done {stats.completed:<6} rejected {stats.rejected}\n"
+            f"wait avg {stats.average_wait:.3f}s max {stats.max_wait:.3f}s run avg {stats.average_run:.3f}s```"
+        )
+
     @commands.command()
     @commands.cooldown(1, 5, type=commands.BucketType.channel)
     async def ocr(
@@ -133,7 +222,7 @@ class Images(Cog):
 
         Note: text rotation is truncated to 90 degrees for now
         Note:
-            Entire text is translated at once for the sake of optimization,
+            Lines are translated together in large chunks for the sake of optimization,
             this might produce bad results. This might be improved in future
             (for multi-language images)
         """
@@ -176,40 +265,56 @@ class Images(Cog):
         self,
         ctx: Context,
         image: StaticImage = None,  # type: ignore
-        amount: int = 1,
-        fly_image: StaticImage = None,  # type: ignore
+        amount: Optional[int] = 1,
+        fly_image: Optional[StaticImage] = None,
+        *,
+        flags: AnimationFlags,
     ) -> None:
-        """Animates flies on image"""
+        """
+        Animates flies on image
+
+        Output format can be chosen with --format gif/webp/apng, for example: fly ~ --format webp
+        """
 
         if image is None:
             image = await StaticImage.from_history(ctx)
 
-        src = await image.to_pil(ctx)
+        src = await image.to_pil(ctx, max_side=MAX_SIDE)
 
         if fly_image is not None:
-            fly_src = await fly_image.to_pil(ctx)
+            fly_src = await fly_image.to_pil(ctx, max_side=FLY_SIDE)
         else:
             fly_src = None
 
         min_amount = 1
         max_amount = 50
 
-        if not min_amount <= amount <= max_amount:
+        if amount is None or not min_amount <= amount <= max_amount:
             raise commands.BadArgument(f"fly amount should be between **{min_amount}** and **{max_amount}**")
 
         # TODO: make configurable
         steps = 100
         velocity = 10
 
-        async with ctx.channel.typing():
-            filename = await draw_flies(src, fly_src, steps, velocity, amount)
+        if flags.output is not None:
+            formats: tuple[AnimationFormat, ...] = (flags.output,)
+        else:
+            formats = DEFAULT_FORMATS
 
-            # optimize gif using gifsicle
-            await run_process("gifsicle", *GIFSICLE_ARGUMENTS, str(filename))
+        size_limit = ctx.guild.filesize_limit if ctx.guild else discord.utils.DEFAULT_FILE_SIZE_LIMIT_BYTES
 
-        await ctx.send(file=discord.File(filename, filename="fly.gif", spoiler=image.is_spoiler))
+        async with ctx.channel.typing():
+            result, animation_format = await schedule(
+                ctx, draw_flies, src, fly_src, steps, velocity, amount, formats, size_limit
+            )
 
-        filename.unlink()
+        await ctx.send(
+            file=discord.File(
+                BytesIO(result),
+                filename=f"fly.{animation_format.extension}",
+                spoiler=image.is_spoiler,
+            )
+        )
 
 
 async def setup(bot: PINK) -> None:
@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import logging
+
+from enum import Enum
+from io import BytesIO
+from typing import Any, Optional, Protocol
+
+from PIL import Image, ImageChops
+
+from .gif import GifEncoder
+from .settings import cog_settings
+
+__all__ = (
+    "AUTO_FORMATS",
+    "DEFAULT_FORMATS",
+    "AnimationFormat",
+    "AnimationWriter",
+    "FrameCollector",
+    "animation_writer",
+)
+
+log = logging.getLogger(__name__)
+
+
+class AnimationFormat(Enum):
+    GIF = "gif"
+    WEBP = "webp"
+    APNG = "apng"
+
+    @property
+    def extension(self) -> str:
+        if self is AnimationFormat.APNG:
+            return "png"
+
+        return self.value
+
+
+# formats tried when user does not choose one, fastest to encode first. see scripts/benchmark_animation.py
+AUTO_FORMATS = (
+    AnimationFormat.GIF,
+    AnimationFormat.APNG,
+    AnimationFormat.WEBP,
+)
+
+
+def _configured_formats(name: str) -> tuple[AnimationFormat, ...]:
+    if name.lower() == "auto":
+        return AUTO_FORMATS
+
+    try:
+        return (AnimationFormat(name.lower()),)
+    except ValueError:
+        log.warning("unknown animation_format %r in settings, using auto", name)
+
+        return AUTO_FORMATS
+
+
+# formats used when user does not choose one, checked once on settings load
+DEFAULT_FORMATS = _configured_formats(cog_settings.animation_format)
+
+
+class AnimationWriter(Protocol):
+    def add_frame(self, frame: Image.Image, offset: tuple[int, int] = (0, 0), *, duration: int) -> None: ...
+
+    def extend(self, duration: int) -> None: ...
+
+    def finish(self) -> bytes: ...
+
+
+class FrameCollector:
+    """
+    Writer for Pillow encoders which need all frames at once. Rebuilds full frames from rectangles, merging identical
+    ones into longer durations. Unlike GIF encoder this keeps every frame in memory.
+    """
+
+    __slots__ = (
+        "pillow_format",
+        "params",
+        "_canvas",
+        "_frames",
+        "_durations",
+    )
+
+    def __init__(self, pillow_format: str, **params: Any):
+        self.pillow_format = pillow_format
+        self.params = params
+
+        self._canvas: Optional[Image.Image] = None
+        self._frames: list[Image.Image] = []
+        self._durations: list[int] = []
+
+    def add_frame(self, frame: Image.Image, offset: tuple[int, int] = (0, 0), *, duration: int) -> None:
+        if (canvas := self._canvas) is None:
+            canvas = self._canvas = frame.copy()
+        else:
+            x, y = offset
+            previous = canvas.crop((x, y, x + frame.width, y + frame.height))
+            identical = ImageChops.difference(previous, frame).getbbox() is None
+            previous.close()
+
+            if identical:
+                self.extend(duration)
+
+                return
+
+            canvas.paste(frame, offset)
+
+        self._frames.append(canvas.copy())
+        self._durations.append(duration)
+
+    def extend(self, duration: int) -> None:
+        assert self._durations, "no frames"
+
+        self._durations[-1] += duration
+
+    def finish(self) -> bytes:
+        assert self._frames, "no frames"
+
+        result = BytesIO()
+        self._frames[0].save(
+            result,
+            format=self.pillow_format,
+            save_all=True,
+            append_images=self._frames[1:],
+            duration=self._durations,
+            loop=0,
+            **self.params,
+        )
+
+        for frame in self._frames:
+            frame.close()
+
+        if self._canvas is not None:
+            self._canvas.close()
+
+        return result.getvalue()
+
+    def __repr__(self) -> str:
+        return f"<{type(self).__name__} format={self.pillow_format} frames={len(self._frames)}>"
+
+
+def animation_writer(animation_format: AnimationFormat, palette: Image.Image, transparency: int) -> AnimationWriter:
+    """
+    Creates writer for palette frames. Transparent index is never used by frames, GIF encoder uses it for unchanged
+    pixels.
+    """
+
+    if animation_format is AnimationFormat.GIF:
+        return GifEncoder(palette, transparency=transparency)
+
+    if animation_format is AnimationFormat.WEBP:
+        return FrameCollector(
+            "WEBP",
+            lossless=cog_settings.webp_lossless,
+            quality=cog_settings.webp_quality,
+            method=cog_settings.webp_method,
+        )
+
+    if animation_format is AnimationFormat.APNG:
+        return FrameCollector("PNG", compress_level=cog_settings.apng_compress_level)
+
+    raise ValueError(f"unknown format: {animation_format}")
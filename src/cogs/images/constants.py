@@ -1 +0,0 @@
-GIFSICLE_ARGUMENTS = ["--optimize=3", "--batch", "--careful"]
@@ -0,0 +1,249 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+
+from collections.abc import Awaitable, Callable, Hashable, Mapping
+from pathlib import Path
+from typing import Optional
+
+import yarl
+
+from src.cache import Cache
+from src.decorators import in_executor
+from src.executors import ExecutorKind
+
+from .settings import cog_settings
+
+__all__ = (
+    "Download",
+    "DownloadCache",
+    "download_cache",
+    "normalize_url",
+)
+
+log = logging.getLogger(__name__)
+
+DISCORD_CDN_HOSTS = (
+    "cdn.discordapp.com",
+    "media.discordapp.net",
+)
+# attachment urls are signed, signature changes every time message is fetched
+DISCORD_SIGNATURE_PARAMS = ("ex", "is", "hm")
+
+# discord attachments never change, everything else is revalidated after this many seconds
+DISCORD_FRESH_FOR = 24 * 3600
+FRESH_FOR = 10 * 60
+
+
+def normalize_url(url: str) -> str:
+    """Cache key for url. Strips discord CDN signature so that different links to same attachment match"""
+
+    parsed = yarl.URL(url)
+
+    if parsed.host not in DISCORD_CDN_HOSTS:
+        return url
+
+    return str(parsed.without_query_params(*DISCORD_SIGNATURE_PARAMS))
+
+
+class Download:
+    """Result of HTTP request. Validators are used for revalidating cached content"""
+
+    __slots__ = (
+        "data",
+        "etag",
+        "last_modified",
+    )
+
+    def __init__(self, data: bytes, etag: Optional[str] = None, last_modified: Optional[str] = None):
+        self.data = data
+        self.etag = etag
+        self.last_modified = last_modified
+
+    def __repr__(self) -> str:
+        return f"<{type(self).__name__} bytes={len(self.data)} etag={self.etag} last_modified={self.last_modified}>"
+
+
+class _Validators:
+    __slots__ = (
+        "digest",
+        "etag",
+        "last_modified",
+    )
+
+    def __init__(self, digest: str, etag: Optional[str], last_modified: Optional[str]):
+        self.digest = digest
+        self.etag = etag
+        self.last_modified = last_modified
+
+    def headers(self) -> dict[str, str]:
+        headers = {}
+
+        if self.etag is not None:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified is not None:
+            headers["If-Modified-Since"] = self.last_modified
+
+        return headers
+
+
+# downloader gets conditional request headers and returns None if content was not modified
+_DownloaderType = Callable[[Mapping[str, str]], Awaitable[Optional[Download]]]
+
+
+class DownloadCache:
+    """
+    Download cache keyed by url and content hash.
+
+    Urls point to sha256 digest of content, content is stored once per digest. Content is kept in memory under byte
+    budget and optionally written to disk directory, which is checked on memory misses.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int,
+        *,
+        directory: Optional[Path] = None,
+        max_disk_bytes: int = 0,
+    ):
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+
+        # url and download limits -> digest, presence means url does not need revalidation. downloads can fail
+        # because of limits, callers with different limits do not share them
+        self._fresh: Cache[tuple[str, Hashable], str] = Cache(4096)
+        # url -> digest and HTTP validators, outlives fresh entries
+        self._validators: Cache[str, _Validators] = Cache(4096)
+        # digest -> content
+        self._blobs: Cache[str, bytes] = Cache(None, max_bytes=max_bytes, sizeof=len)
+
+        if directory is not None:
+            directory.mkdir(parents=True, exist_ok=True)
+
+    def _blob_path(self, digest: str) -> Path:
+        assert self.directory is not None
+
+        return self.directory / digest
+
+    @in_executor(ExecutorKind.IO)
+    def _read_disk(self, digest: str) -> Optional[bytes]:
+        try:
+            return self._blob_path(digest).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    @in_executor(ExecutorKind.IO)
+    def _on_disk(self, digest: str) -> bool:
+        return self._blob_path(digest).exists()
+
+    @in_executor(ExecutorKind.IO)
+    def _write_disk(self, digest: str, data: bytes) -> None:
+        assert self.directory is not None
+
+        if (path := self._blob_path(digest)).exists():
+            # refresh mtime, it is used for eviction
+            path.touch()
+
+            return
+
+        tmp = path.with_suffix(".tmp")
+        tmp.write_bytes(data)
+        tmp.replace(path)
+
+        files = sorted(
+            ((p.stat(), p) for p in self.directory.iterdir() if p.suffix != ".tmp"),
+            key=lambda f: f[0].st_mtime,
+        )
+        total = sum(stat.st_size for stat, _ in files)
+
+        for stat, file in files:
+            if total <= self.max_disk_bytes:
+                break
+
+            file.unlink(missing_ok=True)
+            total -= stat.st_size
+
+    async def _load(self, digest: str) -> Optional[bytes]:
+        if (data := self._blobs.get(digest)) is not None:
+            return data
+
+        if self.directory is None:
+            return None
+
+        if (data := await self._read_disk(digest)) is not None:
+            self._blobs[digest] = data
+
+        return data
+
+    async def _store(self, data: bytes) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+
+        self._blobs[digest] = data
+
+        if self.directory is not None:
+            try:
+                await self._write_disk(digest, data)
+            except OSError as e:
+                log.warning("unable to write %s to disk: %s", digest, e)
+
+        return digest
+
+    async def _has(self, digest: str) -> bool:
+        if digest in self._blobs:
+            return True
+
+        return self.directory is not None and await self._on_disk(digest)
+
+    async def _resolve(self, key: str, download: _DownloaderType) -> str:
+        headers: Mapping[str, str] = {}
+
+        if (validators := self._validators.get(key)) is not None and await self._has(validators.digest):
+            headers = validators.headers()
+
+        if (result := await download(headers)) is None:
+            # not modified
+            assert validators is not None
+
+            return validators.digest
+
+        digest = await self._store(result.data)
+
+        self._validators[key] = _Validators(digest, result.etag, result.last_modified)
+
+        return digest
+
+    async def fetch(self, url: str, download: _DownloaderType, *, limits: Hashable = None) -> bytes:
+        """
+        Returns content of url, calling download only if content is missing or stale. limits identify restrictions
+        download applies, concurrent calls share single download only if their limits are equal.
+        """
+
+        key = normalize_url(url)
+        fresh_for = DISCORD_FRESH_FOR if yarl.URL(url).host in DISCORD_CDN_HOSTS else FRESH_FOR
+
+        digest = await self._fresh.get_or_compute((key, limits), lambda: self._resolve(key, download), ttl=fresh_for)
+
+        if (data := await self._load(digest)) is not None:
+            return data
+
+        # content was evicted after url was resolved, unlikely but possible
+        self._fresh.pop((key, limits))
+        self._validators.pop(key)
+
+        if (result := await download({})) is None:
+            raise RuntimeError(f"got not modified response for unconditional request to {url}")
+
+        await self._store(result.data)
+
+        return result.data
+
+    def __repr__(self) -> str:
+        return f"<{type(self).__name__} urls={self._validators} blobs={self._blobs}>"
+
+
+download_cache = DownloadCache(
+    cog_settings.download_cache_size,
+    directory=None if cog_settings.download_cache_dir is None else Path(cog_settings.download_cache_dir),
+    max_disk_bytes=cog_settings.download_cache_disk_size,
+)
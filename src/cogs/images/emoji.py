@@ -0,0 +1,24 @@
+from pathlib import Path
+
+__all__ = (
+    "emoji_code",
+    "is_emoji",
+)
+
+# known emoji sequences as dash separated hex codepoints without variation selectors
+EMOJI_SEQUENCES = frozenset(
+    line
+    for line in (Path(__file__).parent / "emoji_sequences.txt").read_text().splitlines()
+    if line and not line.startswith("#")
+)
+
+
+def emoji_code(text: str) -> str:
+    """Returns dash separated hex codepoints of text"""
+
+    return "-".join(f"{ord(c):x}" for c in text)
+
+
+def is_emoji(text: str) -> bool:
+    # variation selectors are often missing or have extra copies, they are ignored
+    return emoji_code(text.replace("\N{VARIATION SELECTOR-16}", "")) in EMOJI_SEQUENCES
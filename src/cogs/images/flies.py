@@ -1,19 +1,24 @@
 # original code from KiwiBot:
 # https://github.com/Fogapod/KiwiBot/blob/master/modules/images/module_fly.py
 
-import random
-import time
+from __future__ import annotations
 
-from collections.abc import Sequence
-from math import cos, pi, sin
+import functools
+
+from collections.abc import Iterator, Sequence
+from math import pi
 from pathlib import Path
 from typing import Optional
 
+import numpy as np
+import numpy.typing as npt
+
 from PIL import Image
 
-from src.decorators import in_executor
 from src.errors import PINKError
 
+from .animation import AnimationFormat, animation_writer
+
 DEG_TO_RAD_RATIO = pi / 180
 
 # fly image side (square)
@@ -39,90 +44,191 @@ FINAL_STATE = 6
 # max allowed side of input image
 MAX_SIDE = 512
 
+# colors shared by all frames. last palette index is left free, encoder uses it for unchanged pixels
+PALETTE_COLORS = 255
 
-class Fly:
-    def __init__(self, speed: float = 1.0):
-        self.speed = speed
+# milliseconds per simulation step
+FRAME_DURATION = 100
 
-        self.pos_x = 0
-        self.pos_y = 0
 
-        self.bounds_x = (0, 0)
-        self.bounds_y = (0, 0)
+# actions flies take each step
+ACTION_STAY = 0
+ACTION_ROTATE = 1
+ACTION_MOVE = 2
+ACTION_WEIGHTS = (0.15, 0.15, 0.7)
 
-        self.angle = FIRST_DIRECTION
-        self.state = FIRST_STATE
+# angles by direction index
+ANGLES = np.array(list(DIRECTIONS))
+# direction index after hitting bound: angles above 270 go back to first direction, others turn 90 degrees
+BOUNCES = np.array(
+    [list(DIRECTIONS).index(FIRST_DIRECTION if angle > 270 else angle + 90) for angle in DIRECTIONS],
+)
 
-        self._modified = True
 
-    def _rand_pos(self) -> tuple[int, int]:
-        return (random.randint(*self.bounds_x), random.randint(*self.bounds_y))
+class Flight:
+    """Fly positions, angles and leg states. Arrays have (steps, flies) shape, row for each frame"""
 
-    def _move_forward(self) -> None:
-        angle = self.angle * DEG_TO_RAD_RATIO
-        new_x = self.pos_x + round(cos(angle) * self.speed)
-        new_y = self.pos_y - round(sin(angle) * self.speed)
+    __slots__ = (
+        "x",
+        "y",
+        "angle",
+        "state",
+        "modified",
+    )
 
-        if not ((self.bounds_x[0] <= new_x <= self.bounds_x[1]) and (self.bounds_y[0] <= new_y <= self.bounds_y[1])):
-            new_x = min(self.bounds_x[1], max(self.bounds_x[0], new_x))
-            new_y = min(self.bounds_y[1], max(self.bounds_y[0], new_y))
-            if self.angle > 270:
-                self.angle = FIRST_DIRECTION
-            else:
-                self.angle += 90
+    def __init__(
+        self,
+        x: npt.NDArray[np.int64],
+        y: npt.NDArray[np.int64],
+        angle: npt.NDArray[np.int64],
+        state: npt.NDArray[np.int64],
+        modified: npt.NDArray[np.bool_],
+    ):
+        self.x = x
+        self.y = y
+        self.angle = angle
+        self.state = state
+        # whether anything changed since previous frame, shape is (steps,)
+        self.modified = modified
 
-        elif (new_x, new_y) != (self.pos_x, self.pos_y):
-            self._modifieed = True
+    def __repr__(self) -> str:
+        return f"<{type(self).__name__} steps={self.x.shape[0]} flies={self.x.shape[1]}>"
 
-        self.pos_x, self.pos_y = new_x, new_y
 
-    def _rand_angle(self) -> int:
-        return random.choice([self.angle, *list(DIRECTIONS.keys())])
+def simulate_flight(
+    amount: int,
+    steps: int,
+    speed: float,
+    bounds_x: tuple[int, int],
+    bounds_y: tuple[int, int],
+    rng: Optional[np.random.Generator] = None,
+) -> Flight:
+    """
+    Simulates all flies at once. Each step every fly either stays, rotates to random direction or moves forward,
+    legs move unless fly stays. Flies turn when they hit bounds.
 
-    def _increment_state(self) -> None:
-        if self.state >= FINAL_STATE:
-            self.state = FIRST_STATE
-        else:
-            self.state += 1
+    Only movement depends on previous positions, everything else is computed for all steps in one go.
+    """
+
+    if rng is None:
+        rng = np.random.default_rng()
+
+    # index 0 means keep current direction, same as spawn and rotation picking from current angle and all directions
+    directions = len(DIRECTIONS)
+    spawn_choice = rng.integers(0, directions + 1, size=amount)
+    direction = np.where(spawn_choice == 0, ANGLES.tolist().index(FIRST_DIRECTION), spawn_choice - 1)
+
+    x = rng.integers(bounds_x[0], bounds_x[1], size=amount, endpoint=True)
+    y = rng.integers(bounds_y[0], bounds_y[1], size=amount, endpoint=True)
+
+    actions = rng.choice(len(ACTION_WEIGHTS), size=(steps, amount), p=ACTION_WEIGHTS)
+    rotations = rng.integers(0, directions + 1, size=(steps, amount))
+
+    # movement per step in each direction
+    radians = ANGLES * DEG_TO_RAD_RATIO
+    step_x = np.round(np.cos(radians) * speed).astype(np.int64)
+    step_y = -np.round(np.sin(radians) * speed).astype(np.int64)
+
+    xs = np.empty((steps, amount), dtype=np.int64)
+    ys = np.empty((steps, amount), dtype=np.int64)
+    directions_taken = np.empty((steps, amount), dtype=np.int64)
+
+    for step in range(steps):
+        action = actions[step]
+        rotation = rotations[step]
+
+        direction = np.where((action == ACTION_ROTATE) & (rotation != 0), rotation - 1, direction)
+
+        moving = action == ACTION_MOVE
+
+        new_x = x + step_x[direction]
+        new_y = y + step_y[direction]
+
+        clipped_x = np.clip(new_x, *bounds_x)
+        clipped_y = np.clip(new_y, *bounds_y)
+
+        bounced = moving & ((clipped_x != new_x) | (clipped_y != new_y))
+
+        x = np.where(moving, clipped_x, x)
+        y = np.where(moving, clipped_y, y)
+        direction = np.where(bounced, BOUNCES[direction], direction)
+
+        xs[step] = x
+        ys[step] = y
+        directions_taken[step] = direction
+
+    acted = actions != ACTION_STAY
+
+    state = FIRST_STATE + np.cumsum(acted, axis=0) % (FINAL_STATE - FIRST_STATE + 1)
+
+    modified = acted.any(axis=1)
+    # first frame is always drawn
+    if steps:
+        modified[0] = True
+
+    return Flight(xs, ys, ANGLES[directions_taken], state, modified)
+
+
+class SpriteAtlas:
+    """RGBA fly sprites for every direction and leg state, decoded and ready for compositing"""
 
-        self._modified = True
+    __slots__ = (
+        "animated",
+        "_sprites",
+    )
 
-    def spawn(self, bounds_x: tuple[int, int], bounds_y: tuple[int, int]) -> None:
-        self.bounds_x, self.bounds_y = bounds_x, bounds_y
+    TEMPLATES_PATH = Path(__file__).parent / "templates" / "flies"
 
-        self.pos_x, self.pos_y = self._rand_pos()
-        self.angle = self._rand_angle()
-        self.state = FIRST_STATE
+    def __init__(self, sprites: dict[tuple[int, int], Image.Image], *, animated: bool):
+        # custom sprites do not have legs, there is one sprite per direction
+        self.animated = animated
 
-        self._modified = True
+        self._sprites = sprites
 
-    def do_step(self) -> None:
-        # actions:
-        #   0: do not move
-        #   1: rotate to target
-        #   2: move
+    @classmethod
+    def load_default(cls) -> SpriteAtlas:
+        sprites = {}
 
-        actions = (0, 1, 2)
-        weights = (0.15, 0.15, 0.7)
+        for angle, prefix in DIRECTIONS.items():
+            for state in range(FIRST_STATE, FINAL_STATE + 1):
+                with Image.open(cls.TEMPLATES_PATH / f"{prefix}_{state}.png") as img:
+                    sprites[(angle, state)] = img.convert("RGBA")
 
-        action = random.choices(actions, weights, k=1)[0]
-        if action == 0:
-            return
-        elif action == 1:
-            self.angle = self._rand_angle()
-        elif action == 2:
-            self._move_forward()
+        return cls(sprites, animated=True)
 
-        self._increment_state()
+    @classmethod
+    def from_image(cls, img: Image.Image) -> SpriteAtlas:
+        """Precomputes rotations of custom sprite"""
 
-        self._modified = True
+        return cls({(angle, 0): img.rotate(angle, expand=True) for angle in DIRECTIONS}, animated=False)
+
+    def get(self, angle: int, state: int) -> Image.Image:
+        return self._sprites[(angle, state if self.animated else 0)]
+
+    def sprites(self) -> Iterator[Image.Image]:
+        return iter(self._sprites.values())
+
+    def close(self) -> None:
+        for img in self._sprites.values():
+            img.close()
+
+    def __repr__(self) -> str:
+        return f"<{type(self).__name__} sprites={len(self._sprites)} animated={self.animated}>"
+
+
+@functools.cache
+def default_atlas() -> SpriteAtlas:
+    """Default sprites, loaded once per process"""
+
+    return SpriteAtlas.load_default()
 
 
 class FlyDrawer:
     def __init__(
         self,
         src: Image.Image,
-        flies: Sequence[Fly],
+        amount: int,
+        speed: float,
         steps: int = 100,
         fly_src: Optional[Image.Image] = None,
     ):
@@ -130,109 +236,174 @@ class FlyDrawer:
         self.src.thumbnail((MAX_SIDE, MAX_SIDE), Image.LANCZOS)  # type: ignore
 
         if fly_src:
-            self.fly_src: Optional[Image.Image] = fly_src.convert("RGBA")
-            self.fly_src.thumbnail((FLY_SIDE, FLY_SIDE), Image.LANCZOS)  # type: ignore
+            custom_sprite = fly_src.convert("RGBA")
+            custom_sprite.thumbnail((FLY_SIDE, FLY_SIDE), Image.LANCZOS)  # type: ignore
+
+            self.atlas = SpriteAtlas.from_image(custom_sprite)
+            self._custom_atlas = True
+
+            custom_sprite.close()
         else:
-            self.fly_src = None
+            self.atlas = default_atlas()
+            self._custom_atlas = False
 
         for coordinate in self.src.size:
             if coordinate < FLY_SIDE:
                 raise PINKError("image is too small", formatted=False)
 
-        self.flies = flies
         self.steps = steps
 
         bounds_x = (0, self.src.size[0] - FLY_SIDE)
         bounds_y = (0, self.src.size[1] - FLY_SIDE)
-        for fly in self.flies:
-            fly.spawn(bounds_x, bounds_y)
+        self.flight = simulate_flight(amount, steps, speed, bounds_x, bounds_y)
+
+        # areas covered by flies in last drawn frame
+        self._previous_boxes: Optional[list[tuple[int, int, int, int]]] = None
+        # background quantized to shared palette
+        self._background = self._make_background()
+
+    def _make_background(self) -> Image.Image:
+        """
+        Quantizes background together with every fly sprite. All frames use resulting palette, so it is computed
+        once and frames do not need local color tables
+        """
+
+        fly_images = list(self.atlas.sprites())
+
+        sample = Image.new(
+            "RGBA",
+            (
+                max(self.src.width, sum(img.width for img in fly_images)),
+                self.src.height + max(img.height for img in fly_images),
+            ),
+        )
+        sample.paste(self.src)
+
+        # flies are drawn over background, use part of it to get blended edge colors right
+        x = 0
+        for img in fly_images:
+            sample.paste(self.src.crop((0, 0, *img.size)), (x, self.src.height))
+            sample.alpha_composite(img, (x, self.src.height))
+            x += img.width
+
+        palette = sample.convert("RGB").quantize(PALETTE_COLORS, dither=Image.Dither.NONE)
+        sample.close()
+
+        # map background the same way fly areas are mapped later, otherwise background pixels around flies can get
+        # different colors and show up as changed
+        background = self.src.convert("RGB").quantize(palette=palette, dither=Image.Dither.NONE)
+        palette.close()
+
+        return background
+
+    def _fly_boxes(self, step: int) -> list[tuple[Image.Image, tuple[int, int, int, int]]]:
+        flies = []
 
-        self._cached_flies: dict[str, Image.Image] = {}
-        self._frames: list[Image.Image] = []
+        # plain ints are a lot faster to pass around than numpy scalars
+        for x, y, angle, state in zip(
+            self.flight.x[step].tolist(),
+            self.flight.y[step].tolist(),
+            self.flight.angle[step].tolist(),
+            self.flight.state[step].tolist(),
+            strict=True,
+        ):
+            img = self.atlas.get(angle, state)
+            # rotated custom sprites can be larger than bounds allow
+            box = (x, y, min(x + img.width, self.src.width), min(y + img.height, self.src.height))
 
-    def _get_fly_image(self, angle: int, state: int) -> Image.Image:
-        name = f"{DIRECTIONS[angle]}_{state if not self.fly_src else 0}"
-        if name in self._cached_flies:
-            img = self._cached_flies[name]
+            flies.append((img, box))
+
+        return flies
+
+    def make_frame(self, step: int) -> tuple[Image.Image, tuple[int, int]]:
+        """Redraws area covered by flies in previous and current frame. Returns it with offset"""
+
+        flies = self._fly_boxes(step)
+        boxes = [box for _, box in flies]
+
+        if self._previous_boxes is None:
+            dirty = (0, 0, *self.src.size)
         else:
-            if self.fly_src:
-                img = self.fly_src.rotate(angle, expand=True)
-            else:
-                img = Image.open(Path(__file__).parent / "templates" / "flies" / f"{name}.png")
+            dirty_boxes = boxes + self._previous_boxes
+            dirty = (
+                min(box[0] for box in dirty_boxes),
+                min(box[1] for box in dirty_boxes),
+                max(box[2] for box in dirty_boxes),
+                max(box[3] for box in dirty_boxes),
+            )
 
-            self._cached_flies[name] = img
+        self._previous_boxes = boxes
 
-        return img
+        left, top = dirty[:2]
 
-    def make_frame(self) -> None:
-        modified = False
-        for fly in self.flies:
-            if fly._modified:
-                modified = True
-                break
+        overlay = self.src.crop(dirty)
+        for img, box in flies:
+            overlay.alpha_composite(img, (box[0] - left, box[1] - top))
 
-        if not modified:
-            self._frames.append(self._frames[-1].copy())
-            return
+        # only fly areas differ from background, quantize just them
+        frame = self._background.crop(dirty)
 
-        overlay = self.src.copy()
+        for _, box in flies:
+            local_box = (box[0] - left, box[1] - top, box[2] - left, box[3] - top)
 
-        for fly in self.flies:
-            fly._modified = False
-            img = self._get_fly_image(fly.angle, fly.state)
-            overlay.alpha_composite(img, (fly.pos_x, fly.pos_y))
+            region = overlay.crop(local_box).convert("RGB").quantize(palette=self._background, dither=Image.Dither.NONE)
+            frame.paste(region, local_box[:2])
+            region.close()
 
-        self._frames.append(overlay)
+        overlay.close()
 
-    def cleanup(self) -> None:
-        for frame in self._frames:
-            frame.close()
+        return frame, (left, top)
 
-        for image in self._cached_flies.values():
-            image.close()
+    def cleanup(self) -> None:
+        # default atlas is shared
+        if self._custom_atlas:
+            self.atlas.close()
 
+        self._background.close()
         self.src.close()
-        if self.fly_src:
-            self.fly_src.close()
-
-    def run(self) -> Path:
-        for _ in range(self.steps):
-            for fly in self.flies:
-                fly.do_step()
-
-            self.make_frame()
-
-        filename = Path(f"/tmp/fly_{time.time()}.gif")
-        self._frames[0].save(
-            filename,
-            format="GIF",
-            optimize=True,
-            save_all=True,
-            append_images=self._frames[1:],
-            loop=0,
-            # there are some issues with transparency
-            # https://github.com/python-pillow/Pillow/issues/4644
-            # disposal=3,
-        )
 
-        self.cleanup()
+    def run(self, animation_format: AnimationFormat = AnimationFormat.GIF) -> bytes:
+        """Renders animation. Can be called multiple times, flies move the same way each time"""
+
+        writer = animation_writer(animation_format, self._background, PALETTE_COLORS)
+        self._previous_boxes = None
 
-        return filename
+        for step in range(self.steps):
+            if not self.flight.modified[step]:
+                writer.extend(FRAME_DURATION)
+
+                continue
+
+            frame, offset = self.make_frame(step)
+            writer.add_frame(frame, offset, duration=FRAME_DURATION)
+            frame.close()
+
+        return writer.finish()
 
 
-@in_executor()
 def draw_flies(
     src: Image.Image,
-    fly_src: Image.Image,
+    fly_src: Optional[Image.Image],
     steps: int,
     speed: int,
     amount: int,
-) -> Path:
-    flies = [Fly(speed=speed) for _ in range(amount)]
+    formats: Sequence[AnimationFormat],
+    size_limit: int,
+) -> tuple[bytes, AnimationFormat]:
+    """Tries formats in order, returns first result that fits into size limit"""
 
-    filename = FlyDrawer(src, flies, steps=steps, fly_src=fly_src).run()
+    drawer = FlyDrawer(src, amount, speed, steps=steps, fly_src=fly_src)
     src.close()
     if fly_src:
         fly_src.close()
 
-    return filename
+    try:
+        for animation_format in formats:
+            if len(result := drawer.run(animation_format)) <= size_limit:
+                return result, animation_format
+    finally:
+        drawer.cleanup()
+
+    raise PINKError(
+        f"result is too large, try less flies or {'another format' if len(formats) == 1 else 'smaller image'}"
+    )
@@ -0,0 +1,141 @@
+from io import BytesIO
+from typing import Optional
+
+from PIL import GifImagePlugin, Image, ImageChops
+
+__all__ = ("GifEncoder",)
+
+
+class _PendingFrame:
+    __slots__ = (
+        "image",
+        "offset",
+        "duration",
+        "transparent",
+    )
+
+    def __init__(self, image: Image.Image, offset: tuple[int, int], duration: int, *, transparent: bool):
+        self.image = image
+        self.offset = offset
+        self.duration = duration
+        # unchanged pixels are marked with transparent index
+        self.transparent = transparent
+
+
+class GifEncoder:
+    """
+    Streaming in-memory GIF encoder for animations where every frame uses the same palette.
+
+    Palette is written once as global color table. Frames can be passed as rectangles that were redrawn, only part
+    that actually changed is stored and pixels that did not change inside it are replaced with transparent index so
+    that they compress well. Frames identical to previous one extend its duration instead of being stored.
+
+    Only current state of canvas and last frame are kept in memory. Frames must be P images with given palette and
+    must never use transparent index.
+    """
+
+    __slots__ = (
+        "transparency",
+        "_buffer",
+        "_canvas",
+        "_pending",
+        "_mask_palette",
+    )
+
+    def __init__(self, palette: Image.Image, *, loop: int = 0, transparency: int = 255):
+        self.transparency = transparency
+
+        self._buffer = BytesIO()
+        # what viewer sees after last frame
+        self._canvas: Optional[Image.Image] = None
+        # last frame is written after its final duration is known
+        self._pending: Optional[_PendingFrame] = None
+
+        # maps zero difference to black and everything else to white
+        self._mask_palette = b"\x00" * 3 + b"\xff" * 3 * 255
+
+        # getheader can modify image, only palette and size are needed from it anyway
+        header_image = Image.new("P", palette.size)
+        header_image.putpalette(palette.getpalette())  # type: ignore[arg-type]
+
+        header, _ = GifImagePlugin.getheader(header_image, info={"loop": loop, "transparency": transparency})
+        for chunk in header:
+            self._buffer.write(chunk)
+
+    def _delta(self, canvas: Image.Image, frame: Image.Image, offset: tuple[int, int]) -> Optional[_PendingFrame]:
+        x, y = offset
+        previous = canvas.crop((x, y, x + frame.width, y + frame.height))
+
+        diff = ImageChops.difference(previous, frame)
+        previous.close()
+
+        if (bbox := diff.getbbox()) is None:
+            return None
+
+        diff = diff.crop(bbox)
+        diff.putpalette(self._mask_palette)
+
+        delta = Image.new("P", diff.size, self.transparency)
+        delta.paste(frame.crop(bbox), mask=diff.convert("L"))
+
+        return _PendingFrame(delta, (x + bbox[0], y + bbox[1]), 0, transparent=True)
+
+    def _flush(self) -> None:
+        if (pending := self._pending) is None:
+            return
+
+        params = {"duration": pending.duration}
+        if pending.transparent:
+            params["transparency"] = self.transparency
+
+        for chunk in GifImagePlugin.getdata(pending.image, offset=pending.offset, **params):
+            self._buffer.write(chunk)
+
+        pending.image.close()
+        self._pending = None
+
+    def add_frame(self, frame: Image.Image, offset: tuple[int, int] = (0, 0), *, duration: int) -> None:
+        """
+        Adds frame which redraws rectangle at offset, duration is in milliseconds. First frame must cover entire
+        canvas.
+        """
+
+        if (canvas := self._canvas) is None:
+            self._canvas = frame.copy()
+            self._pending = _PendingFrame(frame.copy(), (0, 0), duration, transparent=False)
+
+            return
+
+        if (pending := self._delta(canvas, frame, offset)) is None:
+            self.extend(duration)
+
+            return
+
+        canvas.paste(frame, offset)
+
+        self._flush()
+
+        pending.duration = duration
+        self._pending = pending
+
+    def extend(self, duration: int) -> None:
+        """Shows last frame for longer"""
+
+        assert self._pending is not None, "no frames"
+
+        self._pending.duration += duration
+
+    def finish(self) -> bytes:
+        self._flush()
+
+        if self._canvas is not None:
+            self._canvas.close()
+            self._canvas = None
+
+        # trailer
+        self._buffer.write(b";")
+
+        return self._buffer.getvalue()
+
+    def __repr__(self) -> str:
+        return f"<{type(self).__name__} bytes={self._buffer.tell()}>"
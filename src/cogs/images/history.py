@@ -0,0 +1,193 @@
+from __future__ import annotations
+
+import contextlib
+
+from collections import deque
+from collections.abc import Callable, Iterable, Sequence
+from typing import Optional
+
+import discord
+
+from src.cache import Cache
+
+__all__ = (
+    "HistoryEntry",
+    "ImageHistory",
+)
+
+
+class HistoryEntry:
+    # message itself is not stored: attachment and embed urls are signed and expire, matched message has to be
+    # fetched again before use
+    __slots__ = (
+        "message_id",
+        "static",
+        "animated",
+    )
+
+    def __init__(self, message_id: int, static: bool, animated: bool):
+        self.message_id = message_id
+        self.static = static
+        self.animated = animated
+
+    def matches(self, *, allow_static: bool, allow_animated: bool) -> bool:
+        return (self.static and allow_static) or (self.animated and allow_animated)
+
+    def __repr__(self) -> str:
+        return f"<{type(self).__name__} message={self.message_id} static={self.static} animated={self.animated}>"
+
+
+class _ChannelHistory:
+    __slots__ = (
+        "ids",
+        "images",
+    )
+
+    def __init__(self, size: int):
+        # ids of all messages seen since channel started being tracked, in order. there are no gaps between them
+        self.ids: deque[int] = deque(maxlen=size)
+        # only messages with images
+        self.images: dict[int, HistoryEntry] = {}
+
+    def append(self, message_id: int) -> None:
+        if len(self.ids) == self.ids.maxlen:
+            self.images.pop(self.ids[0], None)
+
+        self.ids.append(message_id)
+
+    def before(self, message_id: int, limit: int) -> list[int]:
+        """Up to limit ids before given message id, newest first"""
+
+        result = []
+
+        for id_ in reversed(self.ids):
+            if id_ >= message_id:
+                continue
+
+            result.append(id_)
+
+            if len(result) == limit:
+                break
+
+        return result
+
+
+# returns whether message has static and animated images
+_ClassifierType = Callable[[discord.Message], tuple[bool, bool]]
+
+
+class ImageHistory:
+    """
+    Index of recent messages in each channel built from gateway events.
+
+    Tracking starts with first message seen in channel, all messages after that are known, so lookups do not need
+    channel history requests as long as they do not go past tracking start. Gateway events can be missed on
+    reconnects, index should be cleared when that happens.
+    """
+
+    def __init__(self, classify: _ClassifierType, *, channels: int = 256, size: int = 200):
+        self.classify = classify
+        self.size = size
+
+        self._channels: Cache[int, _ChannelHistory] = Cache(channels)
+
+    def _entry(self, message: discord.Message) -> Optional[HistoryEntry]:
+        static, animated = self.classify(message)
+
+        if not (static or animated):
+            return None
+
+        return HistoryEntry(message.id, static, animated)
+
+    def add(self, message: discord.Message) -> None:
+        if (history := self._channels.get(message.channel.id)) is None:
+            history = _ChannelHistory(self.size)
+            self._channels[message.channel.id] = history
+
+        history.append(message.id)
+
+        if (entry := self._entry(message)) is not None:
+            history.images[message.id] = entry
+
+    def tracks(self, channel_id: int, message_id: int) -> bool:
+        if (history := self._channels.get(channel_id)) is None:
+            return False
+
+        return message_id in history.ids
+
+    def update(self, message: discord.Message) -> None:
+        """Reclassify edited message. Discord adds embeds to messages using edits"""
+
+        if (history := self._channels.get(message.channel.id)) is None:
+            return
+
+        if message.id not in history.ids:
+            return
+
+        if (entry := self._entry(message)) is None:
+            history.images.pop(message.id, None)
+        else:
+            history.images[message.id] = entry
+
+    def remove(self, channel_id: int, message_ids: Iterable[int]) -> None:
+        if (history := self._channels.get(channel_id)) is None:
+            return
+
+        for message_id in message_ids:
+            if message_id in history.images:
+                del history.images[message_id]
+
+            # deleted messages are ignored by ^ the same way they are missing from channel history
+            with contextlib.suppress(ValueError):
+                history.ids.remove(message_id)
+
+    def backfill(self, channel_id: int, before: int, messages: Sequence[discord.Message]) -> None:
+        """
+        Prepend messages fetched from channel history. Messages must be newest first and contain everything right
+        before given message id.
+        """
+
+        if (history := self._channels.get(channel_id)) is None:
+            return
+
+        # would leave a gap between fetched and tracked messages
+        if not history.ids or history.ids[0] > before:
+            return
+
+        oldest = history.ids[0]
+
+        for message in messages:
+            if message.id >= oldest:
+                continue
+
+            if len(history.ids) == history.ids.maxlen:
+                break
+
+            history.ids.appendleft(message.id)
+
+            if (entry := self._entry(message)) is not None:
+                history.images[message.id] = entry
+
+    def before(self, channel_id: int, message_id: int, limit: int) -> Optional[list[int]]:
+        """
+        Returns ids of up to limit messages before given message, newest first. Messages after tracking start only.
+
+        Returns None if channel is not tracked.
+        """
+
+        if (history := self._channels.get(channel_id)) is None:
+            return None
+
+        return history.before(message_id, limit)
+
+    def get(self, channel_id: int, message_id: int) -> Optional[HistoryEntry]:
+        if (history := self._channels.get(channel_id)) is None:
+            return None
+
+        return history.images.get(message_id)
+
+    def clear(self) -> None:
+        self._channels.clear()
+
+    def __repr__(self) -> str:
+        return f"<{type(self).__name__} channels={self._channels}>"
@@ -1,50 +1,54 @@
 from __future__ import annotations
 
-import asyncio
-import itertools
+import contextlib
+import functools
+import hashlib
 import math
 
 from collections.abc import Sequence
+from functools import partial
 from io import BytesIO
 from typing import Any, ClassVar, Optional
 
+import discord
+
 from PIL import Image as PilImage, ImageDraw, ImageFilter, ImageFont
 from PIL.Image import Resampling
 from pink_accents import Accent
 
+from src.cache import TieredCache
 from src.context import Context
-from src.decorators import in_executor
 from src.errors import PINKError
-from src.settings import BaseSettings, settings
 
-from .types import Image, StaticImage
+from .ocr_backend import VisionAPIBackend
+from .ocr_geometry import LineGeometry
+from .ocr_lines import Line, annotation_lines, compact_annotations, word_text
+from .ocr_queue import OCRQueue, TokenBucket
+from .ocr_upload import prepare_upload, scale_annotations
+from .scheduler import schedule
+from .settings import cog_settings
+from .types import FetchedImage, Image, StaticImage
 
 __all__ = (
+    "close_ocr_queue",
     "ocr",
     "ocr_translate",
     "textboxes",
 )
 
 
-class CogSettings(BaseSettings):
-    ocr_api_token: str
-
-    class Config(BaseSettings.Config):
-        section = "cog.images"
-
-
-cog_settings = settings.subsettings(CogSettings)
-
-_VertexType = dict[str, int]
-_VerticesType = tuple[_VertexType, _VertexType, _VertexType, _VertexType]
-
-OCR_API_URL = "https://content-vision.googleapis.com/v1/images:annotate"
-OCR_RATELIMIT = 30
+# API accepts up to 16 images per request and 10MB of JSON
+OCR_BATCH_SIZE = 16
+OCR_MAX_BATCH_BYTES = 8 * 1024 * 1024
 
 FONT = ImageFont.truetype("DejaVuSans.ttf")
 
-_ocr_queue: asyncio.Queue[tuple[asyncio.Future[dict[str, Any]], bytes, Context]] = asyncio.Queue(5)
-_task: Optional[asyncio.Task[Any]] = None
+# keyed by hash of image bytes. checked before queue, so repeated commands on the same image skip API and ratelimit
+_ocr_cache: TieredCache[dict[str, Any]] = TieredCache(
+    "ocr",
+    ttl=cog_settings.ocr_cache_ttl,
+    maxsize=cog_settings.ocr_cache_size,
+)
 
 
 class GoogleOCRError(PINKError):
@@ -86,160 +90,47 @@ class AngleUndetectableError(TROCRError):
 
 
 class TextField:
-    def __init__(self, full_text: str, src: PilImage.Image, padding: int = 3):
+    __slots__ = (
+        "text",
+        "left",
+        "upper",
+        "right",
+        "lower",
+        "angle",
+        "_src_width",
+        "_src_height",
+        "_padding",
+    )
+
+    def __init__(
+        self,
+        full_text: str,
+        box: tuple[int, int, int, int],
+        angle: int,
+        src_size: tuple[int, int],
+        padding: int = 3,
+    ):
         self.text = full_text
 
-        self.left: Optional[int] = None
-        self.upper: Optional[int] = None
-        self.right: Optional[int] = None
-        self.lower: Optional[int] = None
+        self.left, self.upper, self.right, self.lower = box
 
-        self.angle = 0
+        self.angle = angle
 
-        self._src_width, self._src_height = src.size
+        self._src_width, self._src_height = src_size
 
         self._padding = padding
 
-    def add_word(self, vertices: _VerticesType, src_size: tuple[int, int]) -> None:
-        if not self.initialized:
-            # Get angle from first word
-            self.angle = self._get_angle(vertices)
-
-        left, upper, right, lower = self._vertices_to_coords(vertices, src_size, self.angle)
-
-        self.left = left if self.left is None else min((self.left, left))
-        self.upper = upper if self.upper is None else min((self.upper, upper))
-        self.right = right if self.right is None else max((self.right, right))
-        self.lower = lower if self.lower is None else max((self.lower, lower))
-
-    @staticmethod
-    def _vertices_to_coords(vertices: _VerticesType, src_size: tuple[int, int], angle: int) -> tuple[int, int, int, int]:
-        """Returns Pillow style coordinates (left, upper, right, lower)."""
-
-        # A - 0
-        # B - 1
-        # C - 2
-        # D - 3
-        #
-        # A----B
-        # |    |  angle = 360/0
-        # D----C
-        #
-        #    A
-        #  /   \
-        # D     B  angle = 315
-        #  \   /
-        #    C
-        #
-        # D----A
-        # |    |  angle = 270
-        # C----B
-        #
-        #    D
-        #  /   \
-        # C     A  angle = 225
-        #  \   /
-        #    B
-        #
-        # C---D
-        # |   | angle = 180
-        # B---A
-        #
-        #    C
-        #  /   \
-        # B     D angle = 135
-        #  \   /
-        #    A
-        #
-        # B---C
-        # |   | angle = 90
-        # A---D
-        #
-        #    B
-        #  /   \
-        # A     C  angle = 45
-        #  \   /
-        #    D
-        if 0 <= angle <= 90:
-            left = vertices[0].get("x")
-            upper = vertices[1].get("y")
-            right = vertices[2].get("x")
-            lower = vertices[3].get("y")
-        elif 90 < angle <= 180:
-            left = vertices[1].get("x")
-            upper = vertices[2].get("y")
-            right = vertices[3].get("x")
-            lower = vertices[0].get("y")
-        elif 180 < angle <= 270:
-            left = vertices[2].get("x")
-            upper = vertices[3].get("y")
-            right = vertices[0].get("x")
-            lower = vertices[1].get("y")
-        elif 270 < angle <= 360:
-            left = vertices[3].get("x")
-            upper = vertices[0].get("y")
-            right = vertices[1].get("x")
-            lower = vertices[2].get("y")
-
-        if left is None:
-            left = 0
-        if upper is None:
-            upper = 0
-        if right is None:
-            right = src_size[0]
-        if lower is None:
-            lower = src_size[1]
-
-        return (left, upper, right, lower)
-
-    @staticmethod
-    def _get_angle(vertices: _VerticesType) -> int:
-        def get_coords(vertex: _VertexType) -> tuple[Optional[int], Optional[int]]:
-            return vertex.get("x"), vertex.get("y")
-
-        cycle = itertools.cycle(vertices)
-        x, y = get_coords(next(cycle))
-        for i in range(4):
-            next_x, next_y = get_coords(next(cycle))
-
-            # Any vertex coordinate can be missing
-            if None in (x, y, next_x, next_y):
-                x, y = next_x, next_y
-                continue
-
-            # algo: https://stackoverflow.com/a/27481611
-
-            # mypy literally does not see previous statement
-            delta_y = y - next_y  # type: ignore
-            delta_x = next_x - x  # type: ignore
-
-            degrees = math.degrees(math.atan2(delta_y, delta_x))
-
-            if degrees < 0:
-                degrees += 360
-
-            # compensate missing vertices
-            degrees += 90 * i
-
-            break
-        else:
-            raise AngleUndetectableError
-
-        # # truncate last digit, OCR often returns 1-2 degree tilted text, ignore this
-        # TEMPORARY: truncate angle to 90 degrees
-        return 90 * round(degrees / 90)
-
     @property
     def coords(self) -> tuple[int, int, int, int]:
-        return (self.left, self.upper, self.right, self.lower)  # type: ignore
+        return (self.left, self.upper, self.right, self.lower)
 
     @property
     def coords_padded(self) -> tuple[int, int, int, int]:
         return (
-            max((0, self.left - self._padding)),  # type: ignore
-            max((0, self.upper - self._padding)),  # type: ignore
-            min((self._src_width, self.right + self._padding)),  # type: ignore
-            min((self._src_height, self.lower + self._padding)),  # type: ignore
+            max((0, self.left - self._padding)),
+            max((0, self.upper - self._padding)),
+            min((self._src_width, self.right + self._padding)),
+            min((self._src_height, self.lower + self._padding)),
         )
 
     # TODO: implement w/h detection ASAP, this is temporary
@@ -251,20 +142,20 @@ class TextField:
     @property
     def width(self) -> int:
         if self.angle in (0, 180, 360):
-            return self.right - self.left  # type: ignore
+            return self.right - self.left
 
         if self.angle in (90, 270):
-            return self.lower - self.upper  # type: ignore
+            return self.lower - self.upper
 
         assert False  # noqa
 
     @property
     def height(self) -> int:
         if self.angle in (0, 180, 360):
-            return self.lower - self.upper  # type: ignore
+            return self.lower - self.upper
 
         if self.angle in (90, 270):
-            return self.right - self.left  # type: ignore
+            return self.right - self.left
 
         assert False  # noqa
 
@@ -276,12 +167,8 @@ class TextField:
     def stroke_width(self) -> int:
         return max((1, round(self.font_size / 12)))
 
-    @property
-    def initialized(self) -> bool:
-        return None not in self.coords
-
     def __repr__(self) -> str:
-        return f"<TextField text='{self.text}' coords={self.coords} angle={self.angle}>"
+        return f"<{type(self).__name__} text='{self.text}' coords={self.coords} angle={self.angle}>"
 
 
 # language iterator is broken. it returns languages for words instead of lines
@@ -323,145 +210,144 @@ class TextField:
 #                 yield paragraph_language or block_language or extract_language(word)
 
 
-async def _fetch_ocr(ctx: Context, image_b64: bytes) -> dict[str, Any]:
-    async with ctx.session.post(
-        OCR_API_URL,
-        params={
-            "key": cog_settings.ocr_api_token,
-        },
-        json={
-            "requests": [
-                {
-                    "features": [{"type": "TEXT_DETECTION"}],
-                    "image": {"content": image_b64.decode()},
-                }
-            ]
-        },
-        headers={
-            "x-origin": "https://explorer.apis.google.com",
-            "x-referer": "https://explorer.apis.google.com",
-        },
-    ) as r:
-        if r.status != 200:
-            if r.content_type.lower() != "application/json":
-                reason = await r.text()
-                if reason.count("\n") > 1:
-                    # we got some garbage HTML response
-                    reason = "unknown error"
+_ocr_queue = OCRQueue(
+    VisionAPIBackend(cog_settings.ocr_api_url, cog_settings.ocr_api_token),
+    bucket=TokenBucket(cog_settings.ocr_requests_per_minute / 60, cog_settings.ocr_burst),
+    batch_size=OCR_BATCH_SIZE,
+    max_batch_bytes=OCR_MAX_BATCH_BYTES,
+    maxsize=cog_settings.ocr_queue_size,
+)
 
-                raise PINKError(f"Something really bad happened with underlying API[{r.status}]: {reason}")
 
-            json = await r.json()
+async def ocr(ctx: Context, image: Image) -> dict[str, Any]:
+    fetched = await image.fetch(ctx)
 
-            raise PINKError(f"Error in underlying API[{r.status}]: " f'{json.get("message", "unknown error")}')
-        json = await r.json()
+    annotations = await _ocr_cache.get_or_compute(
+        hashlib.sha256(fetched.bytes).hexdigest(),
+        partial(_queue_ocr, ctx, fetched),
+    )
 
-    if not (responses := json["responses"]):
-        return {}
+    if "textAnnotations" not in annotations:
+        raise PINKError("no text detected", formatted=False)
 
-    maybe_annotations = responses[0]
+    return annotations
 
-    if "textAnnotations" not in maybe_annotations:
-        if "error" in maybe_annotations:
-            raise GoogleOCRError.from_response(maybe_annotations)
-        else:
-            raise PINKError("no text detected", formatted=False)
 
-    return maybe_annotations
+async def _queue_ocr(ctx: Context, fetched: FetchedImage) -> dict[str, Any]:
+    async def on_queued(wait: float) -> None:
+        # notice is optional, failing to send it should not fail OCR
+        with contextlib.suppress(discord.HTTPException):
+            await ctx.reply(f"please wait **~ {math.ceil(wait)}s**", delete_after=5)
 
+    image_b64, scale_x, scale_y = await prepare_upload(
+        fetched.bytes,
+        max_side=cog_settings.ocr_max_side,
+        upload_format=cog_settings.ocr_upload_format,
+        quality=cog_settings.ocr_upload_quality,
+    )
 
-async def _ocr_fetch_task() -> None:
-    while True:
-        fut, image_b64, ctx = await _ocr_queue.get()
+    annotations = await _ocr_queue.submit(ctx.session, image_b64, on_queued=on_queued)
 
-        try:
-            ocr_result = await _fetch_ocr(ctx, image_b64)
-        except Exception as e:
-            fut.set_exception(e)
-        else:
-            fut.set_result(ocr_result)
+    # errors are not cached, empty annotations (no text) are
+    if "error" in annotations:
+        raise GoogleOCRError.from_response(annotations)
 
-        await asyncio.sleep(OCR_RATELIMIT)
+    annotations = compact_annotations(annotations)
+    # cached annotations are always in original image coordinates
+    scale_annotations(annotations, scale_x, scale_y)
 
+    return annotations
 
-async def ocr(ctx: Context, image: Image) -> dict[str, Any]:
-    global _task
 
-    if _task is None:
-        _task = asyncio.create_task(_ocr_fetch_task())
+def close_ocr_queue() -> None:
+    _ocr_queue.close()
 
-    fut = asyncio.get_running_loop().create_future()
-    image_b64 = await image.to_base64(ctx)
 
-    try:
-        _ocr_queue.put_nowait((fut, image_b64, ctx))
-    except asyncio.QueueFull:
-        raise PINKError(f"OCR queue full ({_ocr_queue.maxsize}), try again later") from None
+@functools.lru_cache(maxsize=64)
+def _font(size: int) -> ImageFont.FreeTypeFont:
+    # loading font variant reads font file, sizes repeat a lot between fields and renders of the same process
+    return FONT.font_variant(size=size)
 
-    if (qsize := _ocr_queue.qsize()) > 1:
-        qsize -= 1
 
-        await ctx.reply(
-            f"please wait **~ {round((qsize - 1) * OCR_RATELIMIT + OCR_RATELIMIT / 2)}s**",
-            delete_after=5,
-        )
+def _blur_fields(src: PilImage.Image, fields: Sequence[TextField], radius: int) -> None:
+    """Blurs all field boxes in place with single filter pass over area covering them"""
+
+    boxes = [field.coords_padded for field in fields]
+
+    # blur looks at pixels around box, take them into account
+    left = max(0, min(box[0] for box in boxes) - radius * 3)
+    upper = max(0, min(box[1] for box in boxes) - radius * 3)
+    right = min(src.width, max(box[2] for box in boxes) + radius * 3)
+    lower = min(src.height, max(box[3] for box in boxes) + radius * 3)
+
+    area = src.crop((left, upper, right, lower))
+    # NOTE: next line causes segfaults if coords are wrong, debug from here
+    blurred = area.filter(ImageFilter.GaussianBlur(radius))
 
-    return await fut
+    mask = PilImage.new("L", area.size)
+    mask_draw = ImageDraw.Draw(mask)
+    for box in boxes:
+        mask_draw.rectangle((box[0] - left, box[1] - upper, box[2] - left - 1, box[3] - upper - 1), fill=255)
 
+    src.paste(blurred, (left, upper), mask)
 
-@in_executor()
-def _draw_trocr(src: PilImage.Image, fields: Sequence[TextField]) -> BytesIO:
+
+def _draw_trocr(src: PilImage.Image, fields: Sequence[TextField]) -> bytes:
     field_cap = 150
 
     fields = fields[:field_cap]
 
     src = src.convert("RGBA")
 
+    _blur_fields(src, fields, 10)
+
+    # text of all fields is drawn into shared masks, one for each stroke width. stroke is made by growing mask instead
+    # of letting FreeType stroke every glyph, which is several times slower than rendering text itself
+    masks: dict[int, PilImage.Image] = {}
+
     for field in fields:
-        cropped = src.crop(field.coords_padded)
+        if (mask := masks.get(field.stroke_width)) is None:
+            mask = masks[field.stroke_width] = PilImage.new("L", src.size)
 
-        # NOTE: next line causes segfaults if coords are wrong, debug from here
-        blurred = cropped.filter(ImageFilter.GaussianBlur(10))
+        font = _font(field.font_size)
 
-        # Does not work anymore for some reason, black stroke is good anyway
-        # field.inverted_avg_color = ImageOps.invert(
-        #     blurred.resize((1, 1)).convert("L")
-        # ).getpixel((0, 0))  # ugly!!!
+        left, top, right, bottom = font.getbbox(field.text)
+        text_size = (int(right - left), int(bottom - top))
+        size = (min(text_size[0], field.width), min(text_size[1], field.height))
+        position = field.coords_padded[:2]
 
-        src.paste(blurred, field.coords_padded)
+        if size == text_size and field.angle % 360 == 0:
+            # fits as is, no need for separate image
+            ImageDraw.Draw(mask).text(
+                (position[0] - left, position[1] - top), text=field.text, font=font, fill=255, spacing=0
+            )
 
-    for field in fields:
-        # TODO: figure out how to fit text into boxes with Pillow without creating
-        # extra images
-        font = FONT.font_variant(size=field.font_size)
-
-        left, top, right, bottom = font.getbbox(field.text, stroke_width=field.stroke_width)
-        text_im = PilImage.new("RGBA", size=(int(right - left), int(bottom - top)))
-
-        ImageDraw.Draw(text_im).text(
-            (0, 0),
-            text=field.text,
-            font=font,
-            spacing=0,
-            stroke_width=field.stroke_width,
-            stroke_fill=(0, 0, 0),
-        )
+            continue
 
-        src.alpha_composite(
-            text_im.resize(
-                (
-                    min((text_im.width, field.width)),
-                    min((text_im.height, field.height)),
-                ),
-            ).rotate(field.angle, expand=True, resample=Resampling.BICUBIC),
-            field.coords_padded[:2],
-        )
+        text_mask = PilImage.new("L", size=text_size)
+        ImageDraw.Draw(text_mask).text((-left, -top), text=field.text, font=font, fill=255, spacing=0)
+
+        if size != text_size:
+            text_mask = text_mask.resize(size)
+
+        if field.angle % 360:
+            text_mask = text_mask.rotate(field.angle, expand=True, resample=Resampling.BICUBIC)
+
+        mask.paste(255, position, text_mask)
+
+    for stroke_width, mask in masks.items():
+        # box blur reaches every pixel within stroke width of text. scaling it by window side makes pixels next to
+        # glyph lines solid while keeping outline edge smooth
+        window = stroke_width * 2 + 1
+        stroke = mask.filter(ImageFilter.BoxBlur(stroke_width)).point(lambda v, window=window: min(255, v * window))
+
+        src.paste((0, 0, 0, 255), mask=stroke)
+        src.paste((255, 255, 255, 255), mask=mask)
 
     result = BytesIO()
     src.save(result, format="PNG")
-    result.seek(0)
 
-    return result
+    return result.getvalue()
 
 
 def _apply_accents(ctx: Context, lines: list[str], accent: Accent) -> list[str]:
@@ -502,14 +388,10 @@ async def _apply_translation(
     # until language iterator is fixed we translate everything
     need_trasnslation = dict(enumerate(lines))
 
-    translated = await translator_cog.translate(  # type: ignore[attr-defined]
-        "\n".join(need_trasnslation.values()), language
+    translated_lines, _ = await translator_cog.translate_lines(  # type: ignore[attr-defined]
+        list(need_trasnslation.values()), language
     )
 
-    translated_lines = translated.split("\n")
-    if len(translated_lines) != len(need_trasnslation):
-        raise RuntimeError(f"expected {len(need_trasnslation)} translated lines, got {len(translated_lines)}")
-
     new_lines = lines.copy()
     for idx, translated_line in zip(need_trasnslation.keys(), translated_lines, strict=True):
         new_lines[idx] = translated_line
@@ -517,59 +399,60 @@ async def _apply_translation(
     return new_lines
 
 
-async def ocr_translate(ctx: Context, image: StaticImage, language: str | Accent) -> tuple[BytesIO, str]:
-    src = await image.to_pil(ctx)
+def _line_fields(
+    src: PilImage.Image,
+    lines: Sequence[Line],
+    texts: Sequence[str],
+) -> tuple[list[Optional[TextField]], str]:
+    """
+    Returns text field with given text for each line, None if line has no words that can be placed. Also returns notes
+    about skipped words.
+    """
 
-    annotations = await ocr(ctx, image)
+    # TODO: merge multiple lines into box
+    boxes, angles, placed, skipped = LineGeometry(lines).boxes(src.size)
 
-    word_annotations = annotations["textAnnotations"][1:]
-    block_annotations = annotations["fullTextAnnotation"]["pages"][0]["blocks"]
+    # error reporting
+    words = [word for line in lines for word in line.words]
+    notes = "".join(f"angle for `{word_text(words[i])}` is undetectable\n" for i in skipped)
 
-    # Google OCR API returns entry for each word separately, but they can be joined
-    # by checking full image description. In description words are combined into
-    # lines, lines are separated by newlines, there is a trailing newline (usually).
-    # Coordinates from words in the same line can be merged
-    lines = annotations["fullTextAnnotation"]["text"].rstrip("\n").split("\n")
+    fields: list[Optional[TextField]] = [
+        TextField(text, tuple(box.tolist()), int(angle), src.size) if is_placed else None
+        for text, box, angle, is_placed in zip(texts, boxes, angles, placed, strict=True)
+    ]
 
-    if isinstance(language, Accent):
-        new_lines = _apply_accents(ctx, lines, language)
-    else:
-        new_lines = await _apply_translation(ctx, lines, language, block_annotations)
+    return fields, notes
 
-    # error reporting
-    notes = ""
 
-    current_word = 0
-    fields = []
+async def ocr_translate(ctx: Context, image: StaticImage, language: str | Accent) -> tuple[BytesIO, str]:
+    src = await image.to_pil(ctx)
 
-    for original_line, line in zip(lines, new_lines, strict=True):
-        field = TextField(line, src)
+    annotations = await ocr(ctx, image)
 
-        remaining_line = original_line
+    block_annotations = annotations["fullTextAnnotation"]["pages"][0]["blocks"]
 
-        # TODO: sane iterator instead of this
-        for word in word_annotations[current_word:]:
-            text = word["description"]
-            if remaining_line.startswith(text):
-                current_word += 1
-                remaining_line = remaining_line[len(text) :].lstrip()
-                # TODO: merge multiple lines into box
-                try:
-                    field.add_word(word["boundingPoly"]["vertices"], src.size)
-                except AngleUndetectableError:
-                    notes += f"angle for `{word}` is undetectable\n"
-            else:
-                break
+    lines = annotation_lines(annotations)
+    original_lines = [line.text for line in lines]
 
-        if field.initialized and line.casefold() != original_line.casefold():
-            fields.append(field)
+    if isinstance(language, Accent):
+        new_lines = _apply_accents(ctx, original_lines, language)
+    else:
+        new_lines = await _apply_translation(ctx, original_lines, language, block_annotations)
+
+    line_fields, notes = _line_fields(src, lines, new_lines)
+    # keep only changed lines
+    fields = [
+        field
+        for field, original_line in zip(line_fields, original_lines, strict=True)
+        if field is not None and field.text.casefold() != original_line.casefold()
+    ]
 
     if not fields:
         raise PINKError("could not translate anything on image", formatted=False)
 
-    result = await _draw_trocr(src, fields)
+    result = BytesIO(await schedule(ctx, _draw_trocr, src, fields))
 
-    stats = f"Words: {current_word}\nLines: {len(fields)}"
+    stats = f"Words: {sum(len(line.words) for line in lines)}\nLines: {len(fields)}"
     if notes:
         stats += f"\nNotes: {notes}"
 
@@ -581,56 +464,24 @@ async def textboxes(ctx: Context, image: StaticImage, outline: tuple[int, int, i
 
     annotations = await ocr(ctx, image)
 
-    word_annotations = annotations["textAnnotations"][1:]
-
-    # Google OCR API returns entry for each word separately, but they can be joined
-    # by checking full image description. In description words are combined into
-    # lines, lines are separated by newlines, there is a trailing newline (usually).
-    # Coordinates from words in the same line can be merged
-    lines = annotations["fullTextAnnotation"]["text"].rstrip("\n").split("\n")
-
-    # error reporting
-    notes = ""
-
-    current_word = 0
-    fields = []
-
-    for original_line, line in zip(lines, lines, strict=True):
-        field = TextField(line, src)
-
-        remaining_line = original_line
-
-        # TODO: sane iterator instead of this
-        for word in word_annotations[current_word:]:
-            text = word["description"]
-            if remaining_line.startswith(text):
-                current_word += 1
-                remaining_line = remaining_line[len(text) :].lstrip()
-                # TODO: merge multiple lines into box
-                try:
-                    field.add_word(word["boundingPoly"]["vertices"], src.size)
-                except AngleUndetectableError:
-                    notes += f"angle for `{word}` is undetectable\n"
-            else:
-                break
+    lines = annotation_lines(annotations)
 
-        if field.initialized:
-            fields.append(field)
+    line_fields, notes = _line_fields(src, lines, [line.text for line in lines])
+    fields = [field for field in line_fields if field is not None]
 
     if not fields:
         raise PINKError("No drawable textboxes", formatted=False)
 
-    result = await _draw_textboxes(src, fields, outline)
+    result = BytesIO(await schedule(ctx, _draw_textboxes, src, fields, outline))
 
-    stats = f"Words: {current_word}\nLines: {len(fields)}"
+    stats = f"Words: {sum(len(line.words) for line in lines)}\nLines: {len(fields)}"
     if notes:
         stats += f"\nNotes: {notes}"
 
     return result, stats
 
 
-@in_executor()
-def _draw_textboxes(src: PilImage.Image, fields: Sequence[TextField], outline: tuple[int, int, int]) -> BytesIO:
+def _draw_textboxes(src: PilImage.Image, fields: Sequence[TextField], outline: tuple[int, int, int]) -> bytes:
     field_cap = 150
 
     fields = fields[:field_cap]
@@ -643,6 +494,5 @@ def _draw_textboxes(src: PilImage.Image, fields: Sequence[TextField], outline: t
 
     result = BytesIO()
     src.save(result, format="PNG")
-    result.seek(0)
 
-    return result
+    return result.getvalue()
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+from collections.abc import Sequence
+from typing import Any, Protocol
+
+import aiohttp
+import orjson
+
+from src.errors import PINKError
+
+__all__ = (
+    "OCRBackend",
+    "VisionAPIBackend",
+)
+
+
+class OCRBackend(Protocol):
+    async def annotate(self, session: aiohttp.ClientSession, images_b64: Sequence[bytes]) -> list[dict[str, Any]]:
+        """Takes base64 encoded images, returns one annotate response for each of them in the same order"""
+        ...
+
+
+class VisionAPIBackend:
+    """
+    Google Vision images:annotate endpoint or anything speaking the same protocol, like scripts/ocr_standin.py for
+    offline testing.
+    """
+
+    __slots__ = (
+        "url",
+        "token",
+    )
+
+    def __init__(self, url: str, token: str):
+        self.url = url
+        self.token = token
+
+    async def annotate(self, session: aiohttp.ClientSession, images_b64: Sequence[bytes]) -> list[dict[str, Any]]:
+        async with session.post(
+            self.url,
+            params={
+                "key": self.token,
+            },
+            # stdlib json is slow with megabytes of base64
+            data=orjson.dumps(
+                {
+                    "requests": [
+                        {
+                            "features": [{"type": "TEXT_DETECTION"}],
+                            "image": {"content": image_b64.decode()},
+                        }
+                        for image_b64 in images_b64
+                    ]
+                }
+            ),
+            headers={
+                "content-type": "application/json",
+                "x-origin": "https://explorer.apis.google.com",
+                "x-referer": "https://explorer.apis.google.com",
+            },
+        ) as r:
+            if r.status != 200:
+                if r.content_type.lower() != "application/json":
+                    reason = await r.text()
+                    if reason.count("\n") > 1:
+                        # we got some garbage HTML response
+                        reason = "unknown error"
+
+                    raise PINKError(f"Something really bad happened with underlying API[{r.status}]: {reason}")
+
+                json = await r.json(loads=orjson.loads)
+
+                raise PINKError(f"Error in underlying API[{r.status}]: " f'{json.get("message", "unknown error")}')
+            json = await r.json(loads=orjson.loads)
+
+        return json.get("responses", [])
+
+    def __repr__(self) -> str:
+        return f"<{type(self).__name__} url={self.url}>"
@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+from collections.abc import Sequence
+
+import numpy as np
+import numpy.typing as npt
+
+from .ocr_lines import Line, word_vertices
+
+__all__ = ("LineGeometry",)
+
+# API omits zero coordinates, old code treated them as missing and so does this
+MISSING = np.iinfo(np.int32).min
+
+
+class LineGeometry:
+    """
+    Word vertices of all lines parsed into arrays once. Angle of each line comes from its first word with detectable
+    angle, box is union of that word and all words after it.
+    """
+
+    __slots__ = (
+        "xs",
+        "ys",
+        "line_ids",
+        "line_count",
+    )
+
+    def __init__(self, lines: Sequence[Line]):
+        coords = []
+        line_ids = []
+
+        for line_id, line in enumerate(lines):
+            for word in line.words:
+                for vertex in word_vertices(word):
+                    coords.append(vertex.get("x", MISSING))
+                    coords.append(vertex.get("y", MISSING))
+
+                line_ids.append(line_id)
+
+        points = np.array(coords, dtype=np.int32).reshape(-1, 4, 2)
+
+        # (words, 4) each
+        self.xs = points[:, :, 0]
+        self.ys = points[:, :, 1]
+        self.line_ids = np.array(line_ids, dtype=np.int32)
+        self.line_count = len(lines)
+
+    def word_angles(self) -> npt.NDArray[np.int32]:
+        """Angle of each word truncated to 90 degrees, -1 if no pair of neighbour vertices is present"""
+
+        present = (self.xs != MISSING) & (self.ys != MISSING)
+        # side i goes from vertex i to vertex i + 1
+        side_present = present & np.roll(present, -1, axis=1)
+        has_side = side_present.any(axis=1)
+        side = side_present.argmax(axis=1)
+
+        rows = np.arange(len(side))
+        x = self.xs[rows, side].astype(np.float64)
+        y = self.ys[rows, side].astype(np.float64)
+        next_x = self.xs[rows, (side + 1) % 4].astype(np.float64)
+        next_y = self.ys[rows, (side + 1) % 4].astype(np.float64)
+
+        # algo: https://stackoverflow.com/a/27481611
+        degrees = np.degrees(np.arctan2(y - next_y, next_x - x)) % 360
+        # compensate missing vertices
+        degrees += 90 * side
+
+        # TEMPORARY: truncate angle to 90 degrees. rounds half to even like builtin round
+        angles = 90 * np.round(degrees / 90).astype(np.int32)
+        angles[angles > 360] -= 360
+
+        return np.where(has_side, angles, -1).astype(np.int32)
+
+    def boxes(
+        self,
+        src_size: tuple[int, int],
+    ) -> tuple[npt.NDArray[np.int32], npt.NDArray[np.int32], npt.NDArray[np.bool_], list[int]]:
+        """
+        Returns (left, upper, right, lower) box and angle of each line, mask of lines that have usable words and indexes
+        of words skipped because of undetectable angle.
+        """
+
+        line_count = self.line_count
+        word_count = len(self.line_ids)
+
+        boxes = np.zeros((line_count, 4), dtype=np.int32)
+        line_angles = np.zeros(line_count, dtype=np.int32)
+
+        if not word_count:
+            return boxes, line_angles, np.zeros(line_count, dtype=np.bool_), []
+
+        word_angles = self.word_angles()
+        detectable = word_angles != -1
+
+        # first word with detectable angle in each line
+        indexes = np.arange(word_count)
+        first = np.full(line_count, word_count, dtype=np.int64)
+        np.minimum.at(first, self.line_ids, np.where(detectable, indexes, word_count))
+
+        placed_lines = first != word_count
+        line_angles[placed_lines] = word_angles[first[placed_lines]]
+
+        # words before first detectable one are skipped, the rest use angle of line
+        used = indexes >= first[self.line_ids]
+        skipped = np.flatnonzero(~used & ~detectable).tolist()
+
+        angles = line_angles[self.line_ids]
+        # vertex order depends on angle:
+        #
+        # A - 0
+        # B - 1
+        # C - 2
+        # D - 3
+        #
+        # A----B
+        # |    |  angle = 360/0
+        # D----C
+        #
+        #    A
+        #  /   \
+        # D     B  angle = 315
+        #  \   /
+        #    C
+        #
+        # D----A
+        # |    |  angle = 270
+        # C----B
+        #
+        #    D
+        #  /   \
+        # C     A  angle = 225
+        #  \   /
+        #    B
+        #
+        # C---D
+        # |   | angle = 180
+        # B---A
+        #
+        #    C
+        #  /   \
+        # B     D angle = 135
+        #  \   /
+        #    A
+        #
+        # B---C
+        # |   | angle = 90
+        # A---D
+        #
+        #    B
+        #  /   \
+        # A     C  angle = 45
+        #  \   /
+        #    D
+        shift = np.select([angles <= 90, angles <= 180, angles <= 270], [0, 1, 2], 3)
+
+        rows = np.arange(word_count)
+        left = self.xs[rows, shift]
+        upper = self.ys[rows, (shift + 1) % 4]
+        right = self.xs[rows, (shift + 2) % 4]
+        lower = self.ys[rows, (shift + 3) % 4]
+
+        width, height = src_size
+        left = np.where(left == MISSING, 0, left)
+        upper = np.where(upper == MISSING, 0, upper)
+        right = np.where(right == MISSING, width, right)
+        lower = np.where(lower == MISSING, height, lower)
+
+        big = np.iinfo(np.int32).max
+        ids = self.line_ids
+
+        box_left = np.full(line_count, big, dtype=np.int32)
+        box_upper = np.full(line_count, big, dtype=np.int32)
+        box_right = np.full(line_count, -1, dtype=np.int32)
+        box_lower = np.full(line_count, -1, dtype=np.int32)
+
+        np.minimum.at(box_left, ids[used], left[used])
+        np.minimum.at(box_upper, ids[used], upper[used])
+        np.maximum.at(box_right, ids[used], right[used])
+        np.maximum.at(box_lower, ids[used], lower[used])
+
+        boxes[placed_lines] = np.stack((box_left, box_upper, box_right, box_lower), axis=1)[placed_lines]
+
+        return boxes, line_angles, placed_lines, skipped
+
+    def __repr__(self) -> str:
+        return f"<{type(self).__name__} lines={self.line_count} words={len(self.line_ids)}>"
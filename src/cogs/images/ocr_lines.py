@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+from typing import Any, Optional
+
+__all__ = (
+    "Line",
+    "annotation_lines",
+    "compact_annotations",
+    "word_text",
+    "word_vertices",
+)
+
+
+_VertexType = dict[str, int]
+_VerticesType = tuple[_VertexType, _VertexType, _VertexType, _VertexType]
+
+# breaks after which next word starts on a new line
+_LINE_BREAKS = frozenset(("EOL_SURE_SPACE", "LINE_BREAK", "HYPHEN"))
+# breaks that add space after word
+_SPACES = frozenset(("SPACE", "SURE_SPACE", "EOL_SURE_SPACE"))
+
+
+class Line:
+    __slots__ = (
+        "text",
+        "words",
+    )
+
+    def __init__(self, text: str, words: list[dict[str, Any]]):
+        self.text = text
+        # raw fullTextAnnotation words
+        self.words = words
+
+    def __repr__(self) -> str:
+        return f"<{type(self).__name__} text={self.text} words={len(self.words)}>"
+
+
+def word_text(word: dict[str, Any]) -> str:
+    return "".join([symbol["text"] for symbol in word["symbols"]])
+
+
+def word_vertices(word: dict[str, Any]) -> _VerticesType:
+    return word["boundingBox"]["vertices"]
+
+
+def _detected_break(word: dict[str, Any]) -> Optional[str]:
+    # break is only set on last symbol of word
+    if (symbol_property := word["symbols"][-1].get("property")) is None:
+        return None
+
+    return symbol_property.get("detectedBreak", {}).get("type")
+
+
+def _line_text(words: list[dict[str, Any]]) -> str:
+    parts = []
+
+    for word in words:
+        parts.append(word_text(word))
+
+        if (detected_break := _detected_break(word)) == "HYPHEN":
+            parts.append("-")
+        elif detected_break in _SPACES:
+            parts.append(" ")
+
+    return "".join(parts).rstrip()
+
+
+def annotation_lines(annotations: dict[str, Any]) -> list[Line]:
+    """
+    Groups words of fullTextAnnotation into lines in a single pass. Line text matches lines of fullTextAnnotation text,
+    words keep their bounding boxes.
+    """
+
+    groups = []
+    words: list[dict[str, Any]] = []
+
+    full_annotation = annotations.get("fullTextAnnotation", {})
+
+    for page in full_annotation.get("pages", ()):
+        for block in page.get("blocks", ()):
+            for paragraph in block.get("paragraphs", ()):
+                for word in paragraph.get("words", ()):
+                    words.append(word)
+
+                    if _detected_break(word) in _LINE_BREAKS:
+                        groups.append(words)
+                        words = []
+
+                # paragraphs always end line, even if break is missing
+                if words:
+                    groups.append(words)
+                    words = []
+
+    # API builds text from the same breaks, rebuilding it from symbols is only needed if it somehow does not match
+    texts = full_annotation.get("text", "").rstrip("\n").split("\n")
+    if len(texts) != len(groups):
+        texts = [_line_text(words) for words in groups]
+
+    return [Line(text, words) for text, words in zip(texts, groups, strict=True)]
+
+
+def compact_annotations(annotations: dict[str, Any]) -> dict[str, Any]:
+    """
+    Returns copy of annotate response with only data used by commands: full text, word boxes, symbol text and breaks.
+    Per word textAnnotations and symbol boxes make up most of response and are dropped.
+    """
+
+    result = {key: value for key, value in annotations.items() if key not in ("textAnnotations", "fullTextAnnotation")}
+
+    if (text_annotations := annotations.get("textAnnotations")) is not None:
+        # first entry is the whole text, presence means something was detected
+        result["textAnnotations"] = text_annotations[:1]
+
+    if (full_annotation := annotations.get("fullTextAnnotation")) is None:
+        return result
+
+    pages = []
+    for page in full_annotation.get("pages", ()):
+        blocks = []
+        for block in page.get("blocks", ()):
+            paragraphs = []
+            for paragraph in block.get("paragraphs", ()):
+                words = []
+                for word in paragraph.get("words", ()):
+                    symbols = [{"text": symbol["text"]} for symbol in word["symbols"]]
+                    symbol_property = word["symbols"][-1].get("property", {})
+                    if (detected_break := symbol_property.get("detectedBreak")) is not None:
+                        symbols[-1]["property"] = {"detectedBreak": detected_break}
+
+                    compact_word = {"boundingBox": word["boundingBox"], "symbols": symbols}
+                    if "property" in word:
+                        compact_word["property"] = word["property"]
+
+                    words.append(compact_word)
+
+                paragraphs.append({key: value for key, value in paragraph.items() if key not in ("words", "confidence")})
+                paragraphs[-1]["words"] = words
+
+            blocks.append({key: value for key, value in block.items() if key not in ("paragraphs", "confidence")})
+            blocks[-1]["paragraphs"] = paragraphs
+
+        pages.append({key: value for key, value in page.items() if key not in ("blocks", "confidence")})
+        pages[-1]["blocks"] = blocks
+
+    result["fullTextAnnotation"] = {"text": full_annotation.get("text", ""), "pages": pages}
+
+    return result
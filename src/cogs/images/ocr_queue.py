@@ -0,0 +1,226 @@
+from __future__ import annotations
+
+import asyncio
+import time
+
+from collections import deque
+from collections.abc import Awaitable, Callable
+from typing import Any, Optional
+
+import aiohttp
+
+from src.errors import PINKError
+
+from .ocr_backend import OCRBackend
+
+__all__ = (
+    "OCRQueue",
+    "TokenBucket",
+)
+
+
+class TokenBucket:
+    """Allows up to capacity calls at once, then refills at rate tokens per second"""
+
+    __slots__ = (
+        "rate",
+        "capacity",
+        "_tokens",
+        "_updated",
+    )
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def delay(self, tokens: int = 1) -> float:
+        """Seconds until given amount of tokens is available"""
+
+        self._refill()
+
+        return max(0.0, (tokens - self._tokens) / self.rate)
+
+    async def wait(self) -> None:
+        """Waits until token is available without taking it"""
+
+        while (delay := self.delay()) > 0:
+            await asyncio.sleep(delay)
+
+    async def take(self) -> None:
+        await self.wait()
+
+        self._tokens -= 1
+
+    def __repr__(self) -> str:
+        self._refill()
+
+        return f"<{type(self).__name__} rate={self.rate} capacity={self.capacity} tokens={self._tokens:.2f}>"
+
+
+class _Job:
+    __slots__ = (
+        "fut",
+        "image_b64",
+        "session",
+    )
+
+    def __init__(self, fut: asyncio.Future[dict[str, Any]], image_b64: bytes, session: aiohttp.ClientSession):
+        self.fut = fut
+        self.image_b64 = image_b64
+        self.session = session
+
+
+class OCRQueue:
+    """
+    Sends queued images to OCR API, one request per bucket token. Images that wait together are packed into single
+    request, up to batch_size images or max_batch_bytes of base64 data.
+    """
+
+    __slots__ = (
+        "backend",
+        "bucket",
+        "batch_size",
+        "max_batch_bytes",
+        "maxsize",
+        "_pending",
+        "_wakeup",
+        "_task",
+    )
+
+    def __init__(
+        self,
+        backend: OCRBackend,
+        *,
+        bucket: TokenBucket,
+        batch_size: int,
+        max_batch_bytes: int,
+        maxsize: int,
+    ):
+        self.backend = backend
+        self.bucket = bucket
+        self.batch_size = batch_size
+        self.max_batch_bytes = max_batch_bytes
+        self.maxsize = maxsize
+
+        self._pending: deque[_Job] = deque()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task[None]] = None
+
+    def estimate(self, position: int) -> float:
+        """Seconds until image at given queue position is sent, assuming full batches"""
+
+        return self.bucket.delay(position // self.batch_size + 1)
+
+    async def submit(
+        self,
+        session: aiohttp.ClientSession,
+        image_b64: bytes,
+        *,
+        on_queued: Optional[Callable[[float], Awaitable[object]]] = None,
+    ) -> dict[str, Any]:
+        """
+        Returns annotate response for image. on_queued is awaited with estimated wait in seconds if image has to wait,
+        image is already queued by then.
+
+        Raises PINKError if queue is full.
+        """
+
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+        if len(self._pending) >= self.maxsize:
+            raise PINKError(f"OCR queue full ({self.maxsize}), try again later")
+
+        job = _Job(asyncio.get_running_loop().create_future(), image_b64, session)
+
+        wait = self.estimate(len(self._pending))
+        self._pending.append(job)
+        self._wakeup.set()
+
+        try:
+            if wait > 0 and on_queued is not None:
+                await on_queued(wait)
+
+            return await job.fut
+        except BaseException:
+            if job in self._pending:
+                self._pending.remove(job)
+
+            raise
+
+    def _next_batch(self) -> list[_Job]:
+        batch: list[_Job] = []
+        size = 0
+
+        while self._pending and len(batch) < self.batch_size:
+            job = self._pending[0]
+            # first image is always sent, even if too large, API will complain about it
+            if batch and size + len(job.image_b64) > self.max_batch_bytes:
+                break
+
+            self._pending.popleft()
+            if job.fut.done():
+                continue
+
+            batch.append(job)
+            size += len(job.image_b64)
+
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            if not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+
+            await self.bucket.wait()
+
+            # jobs can be cancelled while waiting for token, token is spent only if some of them are still waiting
+            if not (batch := self._next_batch()):
+                continue
+
+            await self.bucket.take()
+
+            try:
+                responses = await self.backend.annotate(batch[0].session, [job.image_b64 for job in batch])
+            except Exception as e:
+                for job in batch:
+                    if not job.fut.done():
+                        job.fut.set_exception(e)
+
+                continue
+
+            if len(responses) != len(batch):
+                error = PINKError(f"OCR API returned {len(responses)} results for {len(batch)} images")
+
+                for job in batch:
+                    if not job.fut.done():
+                        job.fut.set_exception(error)
+
+                continue
+
+            for job, response in zip(batch, responses, strict=True):
+                if not job.fut.done():
+                    job.fut.set_result(response)
+
+    def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+        for job in self._pending:
+            job.fut.cancel()
+
+        self._pending.clear()
+
+    def __repr__(self) -> str:
+        return f"<{type(self).__name__} pending={len(self._pending)} batch_size={self.batch_size} bucket={self.bucket}>"
@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import base64
+
+from io import BytesIO
+from typing import Any
+
+from PIL import Image
+
+from src.decorators import in_executor
+from src.executors import ExecutorKind
+
+__all__ = (
+    "prepare_upload",
+    "scale_annotations",
+)
+
+# sent as is if small enough
+_UPLOAD_FORMATS = ("JPEG", "WEBP")
+# larger images are sent as is instead of being decoded just to shrink them. jpeg draft mode avoids full decode, other
+# formats do not have it
+_MAX_DECODE_PIXELS = 32 * 1024 * 1024
+
+
+def _flatten(img: Image.Image) -> Image.Image:
+    if img.mode in ("RGB", "L"):
+        return img
+
+    rgba = img.convert("RGBA")
+    # OCR does not care about transparency, white is the most common background for text
+    flat = Image.new("RGB", img.size, (255, 255, 255))
+    flat.paste(rgba, mask=rgba.getchannel("A"))
+    rgba.close()
+
+    return flat
+
+
+@in_executor(ExecutorKind.CPU)
+def prepare_upload(data: bytes, *, max_side: int, upload_format: str, quality: int) -> tuple[bytes, float, float]:
+    """
+    Returns base64 encoded image for OCR request and factors to scale response coordinates back to original size by.
+
+    Images larger than max_side are shrunk, images in other formats are re-encoded if that makes them smaller. Images
+    Pillow cannot open or that are too large to decode are sent as is, API reports errors for them.
+    """
+
+    try:
+        # bomb warning is turned into exception in types
+        img = Image.open(BytesIO(data))
+    except (OSError, Image.DecompressionBombError, Image.DecompressionBombWarning):
+        return base64.b64encode(data), 1.0, 1.0
+
+    with img:
+        width, height = img.size
+
+        if max(width, height) <= max_side and img.format in _UPLOAD_FORMATS:
+            return base64.b64encode(data), 1.0, 1.0
+
+        if width * height > _MAX_DECODE_PIXELS and img.format != "JPEG":
+            return base64.b64encode(data), 1.0, 1.0
+
+        try:
+            # uses draft and reduce internally
+            img.thumbnail((max_side, max_side))
+            flat = _flatten(img)
+        except OSError:
+            return base64.b64encode(data), 1.0, 1.0
+
+        result = BytesIO()
+        flat.save(result, format=upload_format, quality=quality)
+
+        if flat is not img:
+            flat.close()
+
+        if img.size == (width, height) and result.tell() >= len(data):
+            return base64.b64encode(data), 1.0, 1.0
+
+        return base64.b64encode(result.getvalue()), width / img.width, height / img.height
+
+
+def _scale_vertices(poly: dict[str, Any], scale_x: float, scale_y: float) -> None:
+    # zero coordinates are omitted by API
+    for vertex in poly.get("vertices", ()):
+        if "x" in vertex:
+            vertex["x"] = round(vertex["x"] * scale_x)
+        if "y" in vertex:
+            vertex["y"] = round(vertex["y"] * scale_y)
+
+
+def scale_annotations(annotations: dict[str, Any], scale_x: float, scale_y: float) -> None:
+    """Scales all coordinates in annotate response in place"""
+
+    if scale_x == 1 and scale_y == 1:
+        return
+
+    for annotation in annotations.get("textAnnotations", ()):
+        _scale_vertices(annotation.get("boundingPoly", {}), scale_x, scale_y)
+
+    for page in annotations.get("fullTextAnnotation", {}).get("pages", ()):
+        if "width" in page:
+            page["width"] = round(page["width"] * scale_x)
+        if "height" in page:
+            page["height"] = round(page["height"] * scale_y)
+
+        for block in page.get("blocks", ()):
+            _scale_vertices(block.get("boundingBox", {}), scale_x, scale_y)
+
+            for paragraph in block.get("paragraphs", ()):
+                _scale_vertices(paragraph.get("boundingBox", {}), scale_x, scale_y)
+
+                for word in paragraph.get("words", ()):
+                    _scale_vertices(word.get("boundingBox", {}), scale_x, scale_y)
+
+                    for symbol in word.get("symbols", ()):
+                        _scale_vertices(symbol.get("boundingBox", {}), scale_x, scale_y)
@@ -0,0 +1,233 @@
+from __future__ import annotations
+
+import asyncio
+import importlib
+import logging
+import multiprocessing
+
+from collections.abc import Callable, Sequence
+from concurrent.futures import Future, ProcessPoolExecutor
+from functools import partial
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Optional, ParamSpec, TypeVar
+
+from PIL import Image as PilImage
+
+from src.executors import ExecutorKind, get_executor
+
+__all__ = (
+    "SharedImage",
+    "render",
+    "start_pool",
+    "stop_pool",
+)
+
+log = logging.getLogger(__name__)
+
+T = TypeVar("T")
+P = ParamSpec("P")
+
+# modules with rendering functions, imported by workers ahead of time
+RENDER_MODULES = (
+    "src.cogs.images.flies",
+    "src.cogs.images.ocr",
+)
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+class SharedImage:
+    """
+    Picklable reference to RGBA pixels stored in shared memory. Sending this to worker process instead of Pillow
+    image avoids pickling and piping entire decoded image.
+    """
+
+    __slots__ = (
+        "name",
+        "size",
+    )
+
+    MODE = "RGBA"
+
+    def __init__(self, name: str, size: tuple[int, int]):
+        self.name = name
+        self.size = size
+
+    @classmethod
+    def create(cls, img: PilImage.Image) -> tuple[SharedImage, SharedMemory]:
+        """Copies image pixels to new shared memory block. Block should be closed and unlinked by caller"""
+
+        img = _normalize(img)
+        data = img.tobytes()
+
+        shm = SharedMemory(create=True, size=len(data))
+        assert shm.buf is not None
+
+        shm.buf[: len(data)] = data
+
+        return cls(shm.name, img.size), shm
+
+    def open(self) -> tuple[PilImage.Image, SharedMemory]:
+        """Attaches to shared memory and returns image backed by it. Image must be released before closing memory"""
+
+        # workers share resource tracker with bot process, attaching does not create extra tracked blocks
+        shm = SharedMemory(self.name)
+        assert shm.buf is not None
+
+        width, height = self.size
+        # no copy, image uses shared memory directly
+        img = PilImage.frombuffer(
+            self.MODE,
+            self.size,
+            shm.buf[: width * height * 4],  # type: ignore[arg-type]
+            "raw",
+            self.MODE,
+            0,
+            1,
+        )
+
+        return img, shm
+
+    def __repr__(self) -> str:
+        return f"<{type(self).__name__} name={self.name} size={self.size}>"
+
+
+def _normalize(arg: T) -> T:
+    """Render functions get images in the same mode with or without pool"""
+
+    if isinstance(arg, PilImage.Image) and arg.mode != SharedImage.MODE:
+        return arg.convert(SharedImage.MODE)  # type: ignore[return-value]
+
+    return arg
+
+
+def _run_local(fn: Callable[..., T], args: tuple[Any, ...], kwargs: dict[str, Any]) -> T:
+    """Thread side of render when pool is not running"""
+
+    return fn(*map(_normalize, args), **kwargs)
+
+
+def _initialize(modules: Sequence[str]) -> None:
+    for module in modules:
+        importlib.import_module(module)
+
+
+def _ping() -> None:
+    pass
+
+
+def _run(fn: Callable[..., T], args: tuple[Any, ...], kwargs: dict[str, Any]) -> T:
+    """Worker side of render. Replaces shared image references with images"""
+
+    opened: list[tuple[PilImage.Image, SharedMemory]] = []
+
+    def restore(arg: Any) -> Any:
+        if isinstance(arg, SharedImage):
+            opened.append(arg.open())
+
+            return opened[-1][0]
+
+        return arg
+
+    try:
+        return fn(*map(restore, args), **{k: restore(v) for k, v in kwargs.items()})
+    finally:
+        blocks = []
+
+        for img, shm in opened:
+            img.close()
+            blocks.append(shm)
+
+        # image views have to be gone before memory can be closed
+        opened.clear()
+
+        for shm in blocks:
+            try:
+                shm.close()
+            except BufferError:
+                log.warning("unable to close %s, image is still referenced", shm.name)
+
+
+async def start_pool(workers: int) -> None:
+    """Starts process pool with given number of workers and waits until all of them are ready"""
+
+    global _pool
+
+    if _pool is not None:
+        return
+
+    context = multiprocessing.get_context("forkserver")
+    # forked workers share already imported modules
+    context.set_forkserver_preload(list(RENDER_MODULES))
+
+    _pool = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=context,
+        initializer=_initialize,
+        initargs=(RENDER_MODULES,),
+    )
+
+    loop = asyncio.get_running_loop()
+
+    # workers are started lazily, make them all start now instead of during first commands
+    await asyncio.gather(*[loop.run_in_executor(_pool, _ping) for _ in range(workers)])
+
+    log.info("started process pool with %d workers", workers)
+
+
+def stop_pool() -> None:
+    global _pool
+
+    if _pool is None:
+        return
+
+    _pool.shutdown(wait=False, cancel_futures=True)
+    _pool = None
+
+
+def _share(args: Sequence[Any]) -> tuple[list[Any], list[SharedMemory]]:
+    shared_args = []
+    blocks = []
+
+    for arg in args:
+        if isinstance(arg, PilImage.Image):
+            arg, shm = SharedImage.create(arg)
+            blocks.append(shm)
+
+        shared_args.append(arg)
+
+    return shared_args, blocks
+
+
+async def render(fn: Callable[P, T], *args: P.args, **kwargs: P.kwargs) -> T:
+    """
+    Runs image function in process pool if it is running, otherwise in cpu thread executor.
+
+    Pillow images in positional arguments are given to function in RGBA either way, workers get them through shared
+    memory. Function must be importable by workers and its return value must be picklable.
+    """
+
+    loop = asyncio.get_running_loop()
+    cpu = get_executor(ExecutorKind.CPU)
+
+    if (pool := _pool) is None:
+        return await loop.run_in_executor(cpu, partial(_run_local, fn, args, kwargs))
+
+    shared_args, blocks = await loop.run_in_executor(cpu, _share, args)
+
+    def release(_future: Optional[Future[T]] = None) -> None:
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
+
+    try:
+        future = pool.submit(_run, fn, tuple(shared_args), kwargs)
+    except BaseException:
+        release()
+        raise
+
+    # cancelled command must not free memory that worker is still reading, future is done only once worker is
+    # finished or job was cancelled before starting
+    future.add_done_callback(release)
+
+    return await asyncio.wrap_future(future)
@@ -0,0 +1,209 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import os
+import time
+
+from collections import OrderedDict, deque
+from collections.abc import Awaitable, Callable
+from typing import Optional, ParamSpec, TypeVar
+
+import discord
+
+from src.context import Context
+from src.errors import PINKError
+from src.executors import ExecutorStats
+
+from .pool import render
+from .settings import cog_settings
+
+__all__ = (
+    "RenderScheduler",
+    "RenderStats",
+    "render_scheduler",
+    "schedule",
+)
+
+T = TypeVar("T")
+P = ParamSpec("P")
+
+
+class RenderStats(ExecutorStats):
+    __slots__ = ("rejected",)
+
+    def __init__(self) -> None:
+        super().__init__()
+
+        # jobs turned away because queue was full
+        self.rejected = 0
+
+
+class RenderScheduler:
+    """
+    Bot-wide limit for CPU heavy render jobs.
+
+    Up to concurrency jobs run at once, up to max_queued wait for their turn. Waiting jobs are grouped by guild and
+    guilds take turns, so one guild spamming commands does not delay everyone else. Not thread safe.
+    """
+
+    __slots__ = (
+        "concurrency",
+        "max_queued",
+        "stats",
+        "_running",
+        "_queued",
+        "_queues",
+    )
+
+    def __init__(self, concurrency: int, max_queued: int):
+        self.concurrency = concurrency
+        self.max_queued = max_queued
+
+        self.stats = RenderStats()
+
+        self._running = 0
+        self._queued = 0
+        # guild id -> waiting jobs. first guild gets next free slot and moves to the end
+        self._queues: OrderedDict[Optional[int], deque[asyncio.Future[None]]] = OrderedDict()
+
+    def _position(self, guild_id: Optional[int]) -> int:
+        """Number of jobs that go before new job of given guild, with guilds taking turns"""
+
+        turn = len(self._queues.get(guild_id, ())) + 1
+
+        return sum(min(len(queue), turn) for key, queue in self._queues.items() if key != guild_id) + turn - 1
+
+    def _dispatch(self) -> None:
+        while self._running < self.concurrency and self._queues:
+            guild_id, queue = next(iter(self._queues.items()))
+
+            fut = queue.popleft()
+            self._queued -= 1
+
+            if queue:
+                self._queues.move_to_end(guild_id)
+            else:
+                del self._queues[guild_id]
+
+            self._running += 1
+            fut.set_result(None)
+
+    def _remove(self, guild_id: Optional[int], fut: asyncio.Future[None]) -> None:
+        if (queue := self._queues.get(guild_id)) is None:
+            return
+
+        queue.remove(fut)
+        self._queued -= 1
+
+        if not queue:
+            del self._queues[guild_id]
+
+    async def acquire(
+        self, guild_id: Optional[int], *, on_queued: Optional[Callable[[int], Awaitable[object]]] = None
+    ) -> None:
+        """
+        Waits for free slot. on_queued is awaited with number of jobs ahead if job has to wait, job keeps its place
+        in queue meanwhile.
+
+        Raises PINKError if queue is full.
+        """
+
+        if self._running < self.concurrency and not self._queues:
+            self._running += 1
+
+            return
+
+        if self._queued >= self.max_queued:
+            self.stats.rejected += 1
+
+            raise PINKError(f"render queue is full ({self.max_queued}), try again later")
+
+        position = self._position(guild_id)
+
+        fut = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(guild_id, deque()).append(fut)
+        self._queued += 1
+
+        try:
+            if on_queued is not None:
+                await on_queued(position)
+
+            await fut
+        except BaseException:
+            if fut.done() and not fut.cancelled():
+                # got slot right when cancelled, give it to someone else
+                self.release()
+            else:
+                self._remove(guild_id, fut)
+
+            raise
+
+    def release(self) -> None:
+        self._running -= 1
+
+        self._dispatch()
+
+    async def submit(
+        self,
+        guild_id: Optional[int],
+        on_queued: Optional[Callable[[int], Awaitable[object]]],
+        fn: Callable[P, T],
+        *args: P.args,
+        **kwargs: P.kwargs,
+    ) -> T:
+        """Runs render function once there is a free slot, recording wait and run time"""
+
+        submitted = time.monotonic()
+        self.stats.queued += 1
+
+        try:
+            await self.acquire(guild_id, on_queued=on_queued)
+        finally:
+            self.stats.queued -= 1
+
+        started = time.monotonic()
+        wait = started - submitted
+        self.stats.total_wait += wait
+        self.stats.max_wait = max(self.stats.max_wait, wait)
+        self.stats.active += 1
+
+        def finish(task: asyncio.Task[T]) -> None:
+            self.stats.active -= 1
+            self.stats.completed += 1
+            self.stats.total_run += time.monotonic() - started
+
+            self.release()
+
+            # nobody awaits result of job whose caller was cancelled
+            if not task.cancelled():
+                task.exception()
+
+        task = asyncio.create_task(render(fn, *args, **kwargs))
+        task.add_done_callback(finish)
+
+        # cancelling caller does not stop job that already runs in pool or thread, slot is held until it finishes
+        return await asyncio.shield(task)
+
+    def __repr__(self) -> str:
+        return (
+            f"<{type(self).__name__} concurrency={self.concurrency} running={self._running} queued={self._queued} "
+            f"guilds={len(self._queues)} stats={self.stats}>"
+        )
+
+
+render_scheduler = RenderScheduler(
+    cog_settings.render_concurrency or cog_settings.process_pool_workers or os.cpu_count() or 1,
+    cog_settings.render_queue_size,
+)
+
+
+async def schedule(ctx: Context, fn: Callable[P, T], *args: P.args, **kwargs: P.kwargs) -> T:
+    """Runs render function through bot-wide scheduler, tells user their position if they have to wait"""
+
+    async def on_queued(position: int) -> None:
+        # notice is optional, failing to send it should not fail render
+        with contextlib.suppress(discord.HTTPException):
+            await ctx.reply(f"render queue is busy, your position: **{position + 1}**", delete_after=10)
+
+    return await render_scheduler.submit(ctx.guild.id if ctx.guild else None, on_queued, fn, *args, **kwargs)
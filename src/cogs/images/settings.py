@@ -0,0 +1,52 @@
+from typing import Optional
+
+from src.settings import BaseSettings, settings
+
+__all__ = ("cog_settings",)
+
+
+class CogSettings(BaseSettings):
+    ocr_api_token: str
+    # any server implementing Vision images:annotate, scripts/ocr_standin.py can be used for local testing
+    ocr_api_url: str = "https://content-vision.googleapis.com/v1/images:annotate"
+    # OCR results are cached by image contents for this many seconds, in memory and redis
+    ocr_cache_ttl: int = 24 * 3600
+    # annotations can be large, keep only a few in memory
+    ocr_cache_size: int = 16
+    # images are shrunk to fit into this square and re-encoded as jpeg or webp before upload
+    ocr_max_side: int = 2048
+    ocr_upload_format: str = "jpeg"
+    ocr_upload_quality: int = 90
+    # OCR API calls are limited by token bucket: burst calls at once, then requests_per_minute. images waiting together
+    # are sent in single call
+    ocr_requests_per_minute: float = 2
+    ocr_burst: int = 1
+    ocr_queue_size: int = 32
+
+    # in-memory budget for downloaded images
+    download_cache_size: int = 64 * 1024 * 1024
+    # downloads are also written to this directory if set
+    download_cache_dir: Optional[str] = None
+    download_cache_disk_size: int = 512 * 1024 * 1024
+
+    # number of worker processes for image rendering. 0 renders in threads of bot process
+    process_pool_workers: int = 0
+    # render jobs running at once across all guilds. 0 uses number of pool workers or CPU count
+    render_concurrency: int = 0
+    # render jobs waiting for free slot, commands over this limit are rejected
+    render_queue_size: int = 20
+
+    # animated output format used when user does not pick one: auto, gif, webp or apng. auto picks fastest format
+    # that fits into upload limit
+    animation_format: str = "auto"
+    webp_quality: int = 80
+    # 0 is fastest, 6 is smallest
+    webp_method: int = 4
+    webp_lossless: bool = False
+    apng_compress_level: int = 6
+
+    class Config(BaseSettings.Config):
+        section = "cog.images"
+
+
+cog_settings = settings.subsettings(CogSettings)
@@ -4,9 +4,11 @@ import base64
 import re
 import warnings
 
+from collections.abc import Mapping
 from enum import Enum, auto
+from functools import partial
 from io import BytesIO
-from typing import Any, Literal, Optional
+from typing import Literal, Optional
 
 import aiohttp
 import discord
@@ -16,21 +18,76 @@ import yarl
 from discord.ext import commands
 from PIL.Image import DecompressionBombWarning
 
+from src.cache import Cache
 from src.context import Context
 from src.decorators import in_executor
 from src.errors import PINKError
+from src.executors import ExecutorKind
 from src.regexes import EMOTE_REGEX, ID_REGEX
 
+from .downloads import Download, download_cache
+from .emoji import emoji_code, is_emoji
+from .history import ImageHistory
+
 warnings.simplefilter("error", DecompressionBombWarning)
 
 CLEAN_URL_REGEX = re.compile(r"\A<|>\Z")
 
+TWEMOJI_URL = "https://cdn.notsobot.com/twemoji/512x512/{code}.png"
+
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+# how many messages to check in history
+HISTORY_LIMIT = 200
+# maximum amount of ^ in argument
+MAX_HISTORY_JUMP = 50
+
+# enough bytes to tell apart all supported formats
+MAGIC_LENGTH = 12
+
+
+def sniff_image_format(data: bytes | bytearray) -> Optional[str]:
+    """Detects image format by magic bytes"""
+
+    if data.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+
+    if data.startswith(b"\xff\xd8\xff"):
+        return "jpeg"
+
+    if data.startswith((b"GIF87a", b"GIF89a")):
+        return "gif"
+
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "webp"
+
+    return None
+
 
 # discord cdn generates all formats for emojis. discord.py decided to not support this
 def emoji_url_with_format(emoji: discord.Emoji, fmt: str) -> str:
     return f"{discord.Asset.BASE}/emojis/{emoji.id}.{fmt}"
 
 
+# emoji images never change
+_twemoji_cache: Cache[str, bytes] = Cache(None, max_bytes=16 * 1024 * 1024, sizeof=len)
+
+
+async def fetch_twemoji(ctx: Context, url: str) -> Optional[bytes]:
+    async def fetch() -> bytes:
+        async with ctx.session.get(url, timeout=aiohttp.ClientTimeout(total=5)) as r:
+            if r.status != 200:
+                # raise to avoid caching failures
+                raise PINKError(f"bad status code: **{r.status}**")
+
+            return await r.read()
+
+    try:
+        return await _twemoji_cache.get_or_compute(url, fetch)
+    except PINKError:
+        return None
+
+
 class ImageType(Enum):
     EMOTE = auto()
     EMOJI = auto()
@@ -46,27 +103,47 @@ class FetchedImage:
     def __init__(self, data: bytes):
         self.bytes = data
 
-    @in_executor()
-    def to_pil(self, *, max_dimensions: int = 10000) -> PIL.Image.Image:
-        """Returns Pillow image created from bytes. Should be closed manually. Maybe."""
+    @in_executor(ExecutorKind.CPU)
+    def to_pil(
+        self,
+        *,
+        max_dimensions: int = 10000,
+        max_pixels: int = 25_000_000,
+        max_side: Optional[int] = None,
+    ) -> PIL.Image.Image:
+        """
+        Returns Pillow image created from bytes. Should be closed manually. Maybe.
+
+        If max_side is set, image is shrunk to fit into max_side square while decoding. JPEG is decoded at reduced
+        scale directly, other formats are reduced before resampling which is much cheaper than full size resize.
+        """
 
         try:
+            # only reads header, pixels are decoded later
             img = PIL.Image.open(BytesIO(self.bytes))
         except PIL.Image.DecompressionBombError:
             raise PINKError(f"failed to open image, exceeds **{PIL.Image.MAX_IMAGE_PIXELS}** pixel limit") from None
         except OSError as e:
             raise PINKError(f"failed to open image: {e}", formatted=False) from None
 
-        else:
-            if sum(img.size) > max_dimensions:
-                # TODO: clean up close calls? Pillow seem to stop leaking memory
+        if sum(img.size) > max_dimensions or img.width * img.height > max_pixels:
+            # TODO: clean up close calls? Pillow seem to stop leaking memory
+            img.close()
+
+            raise PINKError(f"Image is too large: **{img.size}pix**")
+
+        if max_side is not None:
+            try:
+                # uses draft and reduce internally, only works before image is loaded
+                img.thumbnail((max_side, max_side))
+            except OSError as e:
                 img.close()
 
-                raise PINKError(f"Image is too large: **{img.size}pix**")
+                raise PINKError(f"failed to open image: {e}", formatted=False) from None
 
         return img
 
-    @in_executor()
+    @in_executor(ExecutorKind.CPU)
     def to_base64(self) -> bytes:
         return base64.b64encode(self.bytes)
 
@@ -175,10 +252,36 @@ class Image:
             return await cls.from_history(ctx)
 
         # match up to 50 previous messages using one or multiple ^'s
-        if re.fullmatch(r"\^{1,50}", argument):
-            history = [m async for m in ctx.channel.history(before=ctx.message.created_at, limit=50)]
+        if re.fullmatch(rf"\^{{1,{MAX_HISTORY_JUMP}}}", argument):
+            position = len(argument)
+
+            ids = image_history.before(ctx.channel.id, ctx.message.id, position)
+            if ids is not None and len(ids) == position:
+                if (entry := image_history.get(ctx.channel.id, ids[-1])) is None:
+                    guild_id = "@me" if ctx.guild is None else ctx.guild.id
+                    message_url = f"https://discord.com/channels/{guild_id}/{ctx.channel.id}/{ids[-1]}"
+
+                    raise commands.BadArgument(f"Nothing found in message <{message_url}>")
+
+                # deleted message shifts positions, channel history is fetched in this case
+                if (indexed := await cls._fetch_indexed(ctx, entry.message_id)) is not None:
+                    if not (
+                        image := cls.from_message(
+                            ctx,
+                            indexed,
+                            allow_static=allow_static,
+                            allow_animated=allow_animated,
+                        )
+                    ):
+                        raise commands.BadArgument(f"Nothing found in message <{indexed.jump_url}>")
+
+                    return image
 
-            message = history[len(argument) - 1]
+            history = [m async for m in ctx.channel.history(before=ctx.message.created_at, limit=MAX_HISTORY_JUMP)]
+
+            image_history.backfill(ctx.channel.id, ctx.message.id, history)
+
+            message = history[position - 1]
 
             if not (
                 image := cls.from_message(
@@ -240,18 +343,18 @@ class Image:
         # check if pattern is emoji
         # thanks NotSoSuper and cake for the CDN
 
-        # thanks discord for this nonsense
-        pattern_no_selector_16 = argument.rstrip("\N{VARIATION SELECTOR-16}")
+        # local table is checked first, CDN is only used for known emoji sequences
+        if is_emoji(argument):
+            # thanks discord for this nonsense
+            pattern_no_selector_16 = argument.rstrip("\N{VARIATION SELECTOR-16}")
 
-        code = "-".join(f"{ord(c):x}" for c in pattern_no_selector_16)
-        emote_url = f"https://cdn.notsobot.com/twemoji/512x512/{code}.png"
+            emote_url = TWEMOJI_URL.format(code=emoji_code(pattern_no_selector_16))
 
-        async with ctx.session.get(emote_url, timeout=aiohttp.ClientTimeout(total=5)) as r:
-            if r.status == 200:
+            if (data := await fetch_twemoji(ctx, emote_url)) is not None:
                 return Image(
                     kind=ImageType.EMOTE,
                     url=emote_url,
-                    data=await r.read(),
+                    data=data,
                 )
 
         # check if pattern is user mention
@@ -311,6 +414,34 @@ class Image:
         *,
         allow_static: bool = True,
         allow_animated: bool = False,
+    ) -> Optional[Image]:
+        return cls._from_message(
+            msg,
+            invoking_message_id=ctx.message.id,
+            allow_static=allow_static,
+            allow_animated=allow_animated,
+        )
+
+    @classmethod
+    def classify(cls, msg: discord.Message) -> tuple[bool, bool]:
+        """Returns whether message has static and animated images"""
+
+        if not (msg.attachments or msg.embeds):
+            return (False, False)
+
+        return (
+            cls._from_message(msg, allow_static=True, allow_animated=False) is not None,
+            cls._from_message(msg, allow_static=False, allow_animated=True) is not None,
+        )
+
+    @classmethod
+    def _from_message(
+        cls,
+        msg: discord.Message,
+        *,
+        invoking_message_id: Optional[int] = None,
+        allow_static: bool = True,
+        allow_animated: bool = False,
     ) -> Optional[Image]:
         # check attachments (files uploaded to discord)
         for attachment in msg.attachments:
@@ -359,7 +490,7 @@ class Image:
 
             # avoid case when image embed was created from url that is
             # used as argument or flag
-            if msg.id == ctx.message.id and embed.thumbnail.url in msg.content:
+            if msg.id == invoking_message_id and embed.thumbnail.url in msg.content:
                 continue
 
             if (
@@ -379,6 +510,18 @@ class Image:
 
         return None
 
+    @staticmethod
+    async def _fetch_indexed(ctx: Context, message_id: int) -> Optional[discord.Message]:
+        """Fetch message found in image history. Index does not keep messages because their image urls expire"""
+
+        try:
+            return await ctx.channel.fetch_message(message_id)
+        except discord.NotFound:
+            # deletion event was missed
+            image_history.remove(ctx.channel.id, (message_id,))
+
+            return None
+
     @classmethod
     async def _from_history(
         cls,
@@ -401,37 +544,86 @@ class Image:
                 allow_animated=allow_animated,
             )
 
+        if (
+            img := cls.from_message(ctx, ctx.message, allow_static=allow_static, allow_animated=allow_animated)
+        ) is not None:
+            return img
+
+        # recent messages are usually known from gateway events
+        if (ids := image_history.before(ctx.channel.id, ctx.message.id, HISTORY_LIMIT)) is not None:
+            for message_id in ids:
+                if (entry := image_history.get(ctx.channel.id, message_id)) is None or not entry.matches(
+                    allow_static=allow_static, allow_animated=allow_animated
+                ):
+                    continue
+
+                if (message := await cls._fetch_indexed(ctx, message_id)) is None:
+                    continue
+
+                if (
+                    img := cls.from_message(ctx, message, allow_static=allow_static, allow_animated=allow_animated)
+                ) is not None:
+                    return img
+
+            # index can miss images, for example embeds added to messages edited while bot was reconnecting.
+            # channel history is the source of truth
+
         # check channel history for attachments
         #
         # command can be invoked by message edit, but we still want
         # to check messages before created_at
-        history = [m async for m in ctx.channel.history(limit=200, before=ctx.message.created_at)]
+        history = [m async for m in ctx.channel.history(limit=HISTORY_LIMIT, before=ctx.message.created_at)]
 
-        for msg in [ctx.message, *history]:
+        image_history.backfill(ctx.channel.id, ctx.message.id, history)
+
+        for msg in history:
             if (img := cls.from_message(ctx, msg, allow_static=allow_static, allow_animated=allow_animated)) is not None:
                 return img
 
-        raise commands.BadArgument("Nothing found in latest 200 messages")
+        raise commands.BadArgument(f"Nothing found in latest {HISTORY_LIMIT} messages")
 
     async def fetch(
         self,
         ctx: Context,
         *,
         url: Optional[str] = None,
-        **kwargs: Any,
+        allow_static: bool = True,
+        allow_animated: bool = False,
+        timeout: int = 15,
+        max_content_length: int = 8000000,
     ) -> FetchedImage:
         if url is None:
             url = self.url
 
         if url == self.url and self.fetched is not None:
-            return self.fetched
+            fetched = self.fetched
         else:
-            image_bytes = await self._fetch(ctx, url, **kwargs)
+            image_bytes = await download_cache.fetch(
+                url,
+                partial(
+                    self._fetch,
+                    ctx,
+                    url,
+                    allow_static=allow_static,
+                    allow_animated=allow_animated,
+                    timeout=timeout,
+                    max_content_length=max_content_length,
+                ),
+                limits=(allow_static, allow_animated, timeout, max_content_length),
+            )
             fetched = FetchedImage(image_bytes)
 
             if url == self.url:
                 self.fetched = fetched
 
+        # content could have been downloaded and checked by another call with different limits
+        self._check_content(
+            fetched.bytes,
+            allow_static=allow_static,
+            allow_animated=allow_animated,
+            max_content_length=max_content_length,
+        )
+
         return fetched
 
     @classmethod
@@ -439,33 +631,54 @@ class Image:
         cls,
         ctx: Context,
         url: str,
+        headers: Mapping[str, str],
         *,
         allow_static: bool = True,
         allow_animated: bool = False,
         timeout: int = 15,
         max_content_length: int = 8000000,
-    ) -> bytes:
+    ) -> Optional[Download]:
+        """Downloads image. Returns None if server responded with 304 to conditional request"""
+
         try:
-            async with ctx.session.get(url, timeout=aiohttp.ClientTimeout(total=timeout)) as r:
+            async with ctx.session.get(url, headers=headers, timeout=aiohttp.ClientTimeout(total=timeout)) as r:
+                if r.status == 304 and headers:
+                    return None
+
                 if r.status != 200:
                     raise PINKError(f"bad status code: **{r.status}**")
 
+                # this is only a hint, body is checked while reading because header can lie or be missing
                 if (r.content_length or 0) > max_content_length:
                     raise PINKError("content is too big", formatted=False)
 
-                allowed_extensions: list[str] = []
-                if allow_static:
-                    allowed_extensions.extend(cls.STATIC_FORMATS)
-                if allow_animated:
-                    allowed_extensions.extend(cls.ANIMATED_FORMATS)
+                allowed_extensions = cls._allowed_extensions(allow_static=allow_static, allow_animated=allow_animated)
 
-                if r.content_type.rpartition("/")[-1].lower() not in allowed_extensions:
-                    raise PINKError(
-                        f"unknown content type: **{r.content_type}**, expected one of "
-                        f'**{", ".join(allowed_extensions)}**'
-                    )
+                buffer = bytearray(min(r.content_length or DOWNLOAD_CHUNK_SIZE, max_content_length))
+                size = 0
+                sniffed = False
+
+                async for chunk in r.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                    end = size + len(chunk)
+                    if end > max_content_length:
+                        raise PINKError("content is too big", formatted=False)
+
+                    # grows buffer if content length was wrong or unknown
+                    buffer[size:end] = chunk
+                    size = end
+
+                    if not sniffed and size >= MAGIC_LENGTH:
+                        cls._check_format(buffer, r.content_type, allowed_extensions)
+                        sniffed = True
 
-                return await r.read()
+                if not sniffed:
+                    cls._check_format(buffer[:size], r.content_type, allowed_extensions)
+
+                return Download(
+                    bytes(memoryview(buffer)[:size]),
+                    etag=r.headers.get("ETag"),
+                    last_modified=r.headers.get("Last-Modified"),
+                )
         except PINKError:
             raise
         except (Exception, TimeoutError) as e:
@@ -477,10 +690,45 @@ class Image:
 
             raise commands.BadArgument(error) from e
 
-    async def to_pil(self, ctx: Context) -> PIL.Image.Image:
+    @classmethod
+    def _allowed_extensions(cls, *, allow_static: bool, allow_animated: bool) -> list[str]:
+        allowed_extensions: list[str] = []
+        if allow_static:
+            allowed_extensions.extend(cls.STATIC_FORMATS)
+        if allow_animated:
+            allowed_extensions.extend(cls.ANIMATED_FORMATS)
+
+        return allowed_extensions
+
+    @classmethod
+    def _check_content(cls, data: bytes, *, allow_static: bool, allow_animated: bool, max_content_length: int) -> None:
+        """Same checks as download does, for content that did not come from network"""
+
+        if len(data) > max_content_length:
+            raise PINKError("content is too big", formatted=False)
+
+        cls._check_format(
+            data[:MAGIC_LENGTH],
+            "unknown",
+            cls._allowed_extensions(allow_static=allow_static, allow_animated=allow_animated),
+        )
+
+    @staticmethod
+    def _check_format(data: bytes | bytearray, content_type: str, allowed_extensions: list[str]) -> None:
+        if (image_format := sniff_image_format(data)) in allowed_extensions:
+            return
+
+        if image_format is None:
+            description = f"unknown image format (content type: **{content_type}**)"
+        else:
+            description = f"unsupported image format: **{image_format}**"
+
+        raise PINKError(f'{description}, expected one of **{", ".join(allowed_extensions)}**')
+
+    async def to_pil(self, ctx: Context, *, max_side: Optional[int] = None) -> PIL.Image.Image:
         fetched = await self.fetch(ctx)
 
-        return await fetched.to_pil()
+        return await fetched.to_pil(max_side=max_side)
 
     async def to_base64(self, ctx: Context) -> bytes:
         fetched = await self.fetch(ctx)
@@ -515,3 +763,6 @@ class AnimatedImage(Image):
         ctx: Context,
     ) -> AnimatedImage:
         return await cls._from_history(ctx, allow_static=False, allow_animated=True)  # type: ignore[return-value]
+
+
+image_history = ImageHistory(Image.classify, size=HISTORY_LIMIT)
@@ -23,6 +23,7 @@ from src.checks import is_owner
 from src.cog import Cog
 from src.context import Context
 from src.converters import Code
+from src.executors import executors
 from src.utils import run_process_shell
 
 COG_MODULE_PREFIX = "src.cogs."
@@ -115,6 +116,24 @@ class TechAdmin(Cog):
 
         await ctx.send(f"reloaded `{extension}`", delete_after=delete_after)
 
+    @commands.command(name="executors", aliases=["pools"])
+    async def _executors(self, ctx: Context) -> None:
+        """Show executor queue stats"""
+
+        if not (running := executors()):
+            return await ctx.send("No executors started yet")
+
+        lines = [
+            f"{e.name:<3} : workers {e.max_workers:<2} queued {e.stats.queued:<3} active {e.stats.active:<2} "
+            f"done {e.stats.completed:<6} wait avg {e.stats.average_wait:.3f}s max {e.stats.max_wait:.3f}s "
+            f"run avg {e.stats.average_run:.3f}s"
+            for e in running.values()
+        ]
+
+        body = "\n".join(lines)
+
+        await ctx.send(f"```\n{body}```")
+
     # https://github.com/Rapptz/RoboDanny/blob/715a5cf8545b94d61823f62db484be4fac1c95b1/cogs/admin.py#L422
     @commands.command(aliases=["doas", "da"])
     async def runas(self, ctx: Context, user: Union[discord.Member, discord.User], *, command: str) -> None:
@@ -1,21 +1,43 @@
-from typing import Optional
+import unicodedata
 
-import googletrans
+from collections.abc import Sequence
+from functools import partial
+from typing import Optional
 
 from discord.ext import commands
 
 from src.bot import PINK
+from src.cache import TieredCache
 from src.cog import Cog
 from src.context import Context
-from src.decorators import in_executor
 
+from .backend import GoogleTranslateBackend, TranslationBackend
 from .constants import LANGUAGES, REVERSE_LANGCODE_ALIASES
+from .planner import translate_lines
+from .settings import cog_settings
 from .types import Language
 
+TRANSLATION_CACHE_TTL = 7 * 24 * 3600
+# translations are small, reposted memes and bot outputs repeat a lot
+TRANSLATION_CACHE_SIZE = 1024
+
+
+def normalize_text(text: str) -> str:
+    # same text can come with different unicode composition or surrounding whitespace
+    return unicodedata.normalize("NFC", text).strip()
+
+
+# (normalized text, destination language) -> {"text": translated text, "src": detected source language}
+_translation_cache: TieredCache[dict[str, str]] = TieredCache(
+    "translation", ttl=TRANSLATION_CACHE_TTL, maxsize=TRANSLATION_CACHE_SIZE
+)
+
 
 class Translator(Cog):
     async def cog_load(self) -> None:
-        self.translator = googletrans.Translator(service_urls=googletrans.constants.DEFAULT_SERVICE_URLS)
+        self.backend: TranslationBackend = GoogleTranslateBackend(
+            cog_settings.translate_api_url, timeout=cog_settings.translate_timeout
+        )
 
     @commands.group(
         name="translate",
@@ -43,28 +65,48 @@ class Translator(Cog):
             await ctx.send_help(ctx.command)
             return
 
-        translated = await self._raw_translate(text, language)
+        translated, src = await self.translate_lines(text.split("\n"), language)
 
-        maybe_in_lang_alias = REVERSE_LANGCODE_ALIASES.get(translated.src.lower(), translated.src)
+        maybe_in_lang_alias = REVERSE_LANGCODE_ALIASES.get(src.lower(), src)
 
         if (in_lang := LANGUAGES.get(maybe_in_lang_alias)) is not None:
             # full name found, need to title() it
             in_lang = in_lang.title()
         else:
-            in_lang = translated.src
+            in_lang = src
 
         out_lang = LANGUAGES[language].title()
 
-        await ctx.send(f"**{in_lang}** -> **{out_lang}**```\n{translated.text}```")
+        translated_text = "\n".join(translated)
 
-    @in_executor()
-    def _raw_translate(self, text: str, out_lang: str) -> googletrans.models.Translated:
-        return self.translator.translate(text, dest=out_lang)
+        await ctx.send(f"**{in_lang}** -> **{out_lang}**```\n{translated_text}```")
+
+    async def _fetch_translation(self, text: str, out_lang: str) -> dict[str, str]:
+        return await self.backend.translate(self.bot.session, text, out_lang)
+
+    async def _raw_translate(self, text: str, out_lang: str) -> dict[str, str]:
+        """Returns translated text and detected source language, cached by normalized text and out_lang"""
+
+        text = normalize_text(text)
+
+        return await _translation_cache.get_or_compute(
+            f"{out_lang}:{text}", partial(self._fetch_translation, text, out_lang)
+        )
+
+    async def translate_lines(self, lines: Sequence[str], out_lang: str) -> tuple[list[str], str]:
+        """Returns translated lines in the same order and detected source language"""
+
+        return await translate_lines(
+            partial(self._raw_translate, out_lang=out_lang),
+            lines,
+            max_chars=cog_settings.translate_chunk_size,
+            concurrency=cog_settings.translate_concurrency,
+        )
 
     async def translate(self, text: str, out_lang: str) -> str:
-        translated = await self._raw_translate(text, out_lang)
+        translated, _ = await self.translate_lines(text.split("\n"), out_lang)
 
-        return translated.text
+        return "\n".join(translated)
 
     @_translate.command(name="list")  # type: ignore
     async def _language_list(self, ctx: Context) -> None:
@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+from typing import Any, Protocol
+
+import aiohttp
+import orjson
+
+from src.errors import PINKError
+
+__all__ = (
+    "GoogleTranslateBackend",
+    "TranslationBackend",
+)
+
+
+class TranslationBackend(Protocol):
+    async def translate(self, session: aiohttp.ClientSession, text: str, out_lang: str) -> dict[str, str]:
+        """Returns {"text": translated text, "src": detected source language}"""
+        ...
+
+
+class GoogleTranslateBackend:
+    """
+    Google Translate gtx endpoint or anything speaking the same protocol, like scripts/translate_standin.py for
+    offline testing.
+    """
+
+    __slots__ = (
+        "url",
+        "timeout",
+    )
+
+    def __init__(self, url: str, *, timeout: float):
+        self.url = url
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+
+    @staticmethod
+    def _parse(data: Any) -> dict[str, str]:
+        # [[[translated part, original part, ...], ...], None, detected language, ...]
+        try:
+            parts = data[0] or ()
+            src = data[2]
+        except (IndexError, KeyError, TypeError):
+            raise PINKError("unexpected response from translation API") from None
+
+        return {"text": "".join([part[0] for part in parts if part[0] is not None]), "src": src or "auto"}
+
+    async def translate(self, session: aiohttp.ClientSession, text: str, out_lang: str) -> dict[str, str]:
+        try:
+            # text goes in body because query length is limited
+            async with session.post(
+                self.url,
+                params={
+                    "client": "gtx",
+                    "sl": "auto",
+                    "tl": out_lang,
+                    "dt": "t",
+                },
+                data={"q": text},
+                timeout=self.timeout,
+            ) as r:
+                if r.status != 200:
+                    raise PINKError(f"Error in translation API[{r.status}]: {r.reason}")
+
+                data = orjson.loads(await r.read())
+        except TimeoutError:
+            raise PINKError("translation API timed out") from None
+
+        return self._parse(data)
+
+    def __repr__(self) -> str:
+        return f"<{type(self).__name__} url={self.url}>"
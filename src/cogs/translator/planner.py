@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import asyncio
+
+from collections import Counter
+from collections.abc import Awaitable, Callable, Sequence
+
+__all__ = ("translate_lines",)
+
+
+# takes text, returns {"text": translated text, "src": detected source language}
+_TranslateFn = Callable[[str], Awaitable[dict[str, str]]]
+
+
+class _Piece:
+    """Part of line that is sent for translation with whitespace around it that is kept as is"""
+
+    __slots__ = (
+        "lead",
+        "unit",
+        "trail",
+    )
+
+    def __init__(self, lead: str, unit: int, trail: str):
+        self.lead = lead
+        # index of text in deduplicated list
+        self.unit = unit
+        self.trail = trail
+
+    def __repr__(self) -> str:
+        return f"<{type(self).__name__} unit={self.unit}>"
+
+
+def _split_line(line: str, max_chars: int) -> list[str]:
+    """Cuts line into parts of at most max_chars, at last space if possible"""
+
+    parts = []
+
+    while len(line) > max_chars:
+        if (cut := line.rfind(" ", 0, max_chars + 1)) <= 0:
+            cut = max_chars
+
+        parts.append(line[:cut])
+        line = line[cut:]
+
+    parts.append(line)
+
+    return parts
+
+
+def _chunks(units: Sequence[str], max_chars: int) -> list[list[int]]:
+    """Groups consecutive units into chunks with at most max_chars when joined by newlines"""
+
+    chunks: list[list[int]] = []
+    chunk: list[int] = []
+    size = 0
+
+    for i, unit in enumerate(units):
+        if chunk and size + 1 + len(unit) > max_chars:
+            chunks.append(chunk)
+            chunk = []
+            size = 0
+
+        size += len(unit) + bool(chunk)
+        chunk.append(i)
+
+    if chunk:
+        chunks.append(chunk)
+
+    return chunks
+
+
+async def translate_lines(
+    translate: _TranslateFn,
+    lines: Sequence[str],
+    *,
+    max_chars: int,
+    concurrency: int,
+) -> tuple[list[str], str]:
+    """
+    Translates lines keeping their count and order. Returns translated lines and source language detected for most of
+    text, "auto" if there was nothing to translate.
+
+    Repeated lines are translated once, the rest is packed into newline separated chunks of at most max_chars that are
+    translated concurrently, at most concurrency at once. If translation of chunk does not have the same number of lines,
+    lines of that chunk are translated separately.
+    """
+
+    units: list[str] = []
+    unit_ids: dict[str, int] = {}
+    line_pieces: list[list[_Piece]] = []
+
+    for line in lines:
+        pieces = []
+
+        for part in _split_line(line, max_chars):
+            if not (text := part.strip()):
+                # whitespace is not translated, keep it in lead
+                pieces.append(_Piece(part, -1, ""))
+
+                continue
+
+            if (unit := unit_ids.get(text)) is None:
+                unit = unit_ids[text] = len(units)
+                units.append(text)
+
+            start = part.index(text)
+            pieces.append(_Piece(part[:start], unit, part[start + len(text) :]))
+
+        line_pieces.append(pieces)
+
+    translated = [""] * len(units)
+    languages: Counter[str] = Counter()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def translate_unit(unit: int) -> None:
+        async with semaphore:
+            result = await translate(units[unit])
+
+        translated[unit] = result["text"].replace("\n", " ")
+        languages[result["src"]] += len(units[unit])
+
+    async def translate_chunk(chunk: list[int]) -> None:
+        if len(chunk) == 1:
+            await translate_unit(chunk[0])
+
+            return
+
+        async with semaphore:
+            result = await translate("\n".join([units[unit] for unit in chunk]))
+
+        if len(chunk_lines := result["text"].split("\n")) != len(chunk):
+            # API merged or split some lines, positions would not match
+            await asyncio.gather(*[translate_unit(unit) for unit in chunk])
+
+            return
+
+        for unit, text in zip(chunk, chunk_lines, strict=True):
+            translated[unit] = text
+
+        languages[result["src"]] += sum(len(units[unit]) for unit in chunk)
+
+    await asyncio.gather(*[translate_chunk(chunk) for chunk in _chunks(units, max_chars)])
+
+    result = [
+        "".join(
+            [
+                piece.lead if piece.unit == -1 else f"{piece.lead}{translated[piece.unit]}{piece.trail}"
+                for piece in pieces
+            ]
+        )
+        for pieces in line_pieces
+    ]
+
+    if not languages:
+        return result, "auto"
+
+    return result, languages.most_common(1)[0][0]
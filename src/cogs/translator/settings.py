@@ -0,0 +1,19 @@
+from src.settings import BaseSettings, settings
+
+__all__ = ("cog_settings",)
+
+
+class CogSettings(BaseSettings):
+    # any server speaking Google Translate gtx protocol, scripts/translate_standin.py can be used for local testing
+    translate_api_url: str = "https://translate.googleapis.com/translate_a/single"
+    # seconds for whole translation request including reading response
+    translate_timeout: float = 10
+    # long and multi-line text is split into chunks of at most this many characters, translated concurrently
+    translate_chunk_size: int = 1000
+    translate_concurrency: int = 4
+
+    class Config(BaseSettings.Config):
+        section = "cog.translator"
+
+
+cog_settings = settings.subsettings(CogSettings)
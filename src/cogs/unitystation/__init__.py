@@ -6,12 +6,32 @@ from discord.ext import commands
 from src.bot import PINK
 from src.cog import Cog
 from src.context import Context
+from src.decorators import cached
 
 from .servers import ServerListClient
 
 # avoid invite scraping
 US_INVITE = "tFcTpBp"
 
+CHANGELOG_URL = "https://changelog.unitystation.org"
+
+
+# builds do not change after release, but missing ones might appear later
+@cached("us_changes", ttl=3600, key=lambda _ctx, build: build)
+async def fetch_changes(ctx: Context, build: str) -> list[dict[str, Any]]:
+    async with ctx.session.get(f"{CHANGELOG_URL}/changes/{build}") as r:
+        changes: list[dict[str, Any]] = await r.json()
+
+        return changes
+
+
+@cached("us_whats_new", ttl=300, key=lambda _ctx: "whats-new")
+async def fetch_whats_new(ctx: Context) -> dict[str, Any]:
+    async with ctx.session.get(f"{CHANGELOG_URL}/whats-new") as r:
+        data: dict[str, Any] = await r.json()
+
+        return data
+
 
 class UnityStation(Cog):
     # f-strings and .format do not count as docstring
@@ -148,14 +168,11 @@ class UnityStation(Cog):
         """Unitystation changelog"""
 
         if build is not None:
-            async with ctx.session.get(f"https://changelog.unitystation.org/changes/{build}") as r:
-                changes: list[dict[str, Any]] = await r.json()
-
+            changes = await fetch_changes(ctx, build)
         else:
-            async with ctx.session.get("https://changelog.unitystation.org/whats-new") as r:
-                data = await r.json()
-                build = data["build"]
-                changes = data["changes"]
+            data = await fetch_whats_new(ctx)
+            build = data["build"]
+            changes = data["changes"]
 
         if not changes:
             await ctx.reply(f"No changes in build **{build}** or it does not exist at all idk")
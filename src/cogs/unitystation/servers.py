@@ -3,29 +3,29 @@ from __future__ import annotations
 import asyncio
 import collections
 import logging
-import time
 
 from collections.abc import Mapping
 from dataclasses import InitVar, dataclass, field
+from functools import partial
 from typing import Any, ClassVar
 
 import aiohttp
 
-from aiocache import SimpleMemoryCache
-
+from src.cache import Cache
 from src.context import Context
+from src.decorators import cached
 from src.errors import PINKError
 
 log = logging.getLogger(__name__)
 
 
+SERVER_LIST_URL = "https://api.unitystation.org/serverlist"
+
 DownloadAddressResponse = collections.namedtuple("DownloadAddressResponse", ["status", "error"])
 
 
 class DownloadAddress:
-    _cache: ClassVar[SimpleMemoryCache] = SimpleMemoryCache(ttl=60)
-    _locks: ClassVar[SimpleMemoryCache] = SimpleMemoryCache(ttl=60)
-    _locks_lock = asyncio.Lock()
+    _cache: ClassVar[Cache[str, DownloadAddressResponse]] = Cache(256, ttl=60)
 
     def __init__(self, name: str, url: str):
         self.name = name
@@ -34,37 +34,17 @@ class DownloadAddress:
         self.response = DownloadAddressResponse(0, "not fetched")
 
     async def check(self, ctx: Context) -> None:
-        # cached by earlier requests
-        if response := await self._cache.get(self.url):
-            self.response = response
-
-            return
-
-        # not in cache - try to be the only one to fetch this url
-        async with self._locks_lock:
-            if fut := await self._locks.get(self.url):
-                # we are not first, just wait for response
-                self.response = await fut
-                return
-            else:
-                # we are first, lock url
-                fut = asyncio.get_running_loop().create_future()
-
-                await self._locks.add(self.url, fut)
+        # many servers share download urls, only one request is made for each url
+        self.response = await self._cache.get_or_compute(self.url, partial(self._fetch, ctx))
 
+    async def _fetch(self, ctx: Context) -> DownloadAddressResponse:
         try:
             async with ctx.session.head(self.url, timeout=aiohttp.ClientTimeout(total=10)) as r:
-                response = DownloadAddressResponse(r.status, None)
+                return DownloadAddressResponse(r.status, None)
         except Exception as e:
             log.error("fetching %r: %s: %s", self, type(e).__name__, str(e))
 
-            response = DownloadAddressResponse(-1, type(e).__name__)
-
-        self.response = response
-
-        fut.set_result(response)
-
-        await self._cache.set(self.url, response)
+            return DownloadAddressResponse(-1, type(e).__name__)
 
     @property
     def ok(self) -> bool:
@@ -155,22 +135,25 @@ class ServerListClient:
 
     def __init__(self) -> None:
         self.servers: list[Server] = []
-        self._fetch_time = time.monotonic() - self.FETCH_INTERVAL
-
-    async def fetch(self, ctx: Context) -> None:
-        if time.monotonic() - self._fetch_time < self.FETCH_INTERVAL:
-            return
+        self._data: dict[str, Any] = {}
 
-        async with ctx.session.get(
-            "https://api.unitystation.org/serverlist",
-            timeout=aiohttp.ClientTimeout(total=30),
-        ) as r:
+    @staticmethod
+    @cached("us_serverlist", ttl=FETCH_INTERVAL, key=lambda _ctx: SERVER_LIST_URL)
+    async def _fetch_data(ctx: Context) -> dict[str, Any]:
+        async with ctx.session.get(SERVER_LIST_URL, timeout=aiohttp.ClientTimeout(total=30)) as r:
             if r.status != 200:
                 raise PINKError(f"Bad API response status code: **{r.status}**")
 
-            data = await r.json()
+            data: dict[str, Any] = await r.json()
+
+            return data
+
+    async def fetch(self, ctx: Context) -> None:
+        # same object is returned from cache until it expires
+        if (data := await self._fetch_data(ctx)) is self._data:
+            return
 
-        self._fetch_time = time.monotonic()
+        self._data = data
 
         self.servers = sorted(
             [Server.from_data(s) for s in data["servers"]],
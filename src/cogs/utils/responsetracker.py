@@ -5,7 +5,7 @@ from typing import Any, Union
 import discord
 
 from src.bot import PINK
-from src.cache import LRU
+from src.cache import Cache
 from src.cog import Cog
 from src.context import Context
 from src.hooks import HookHost
@@ -80,7 +80,7 @@ class ReactionResponse(RemovableResponse):
 
 
 class ResponseTracker(Cog, HookHost):
-    responses = LRU(1024)
+    responses: Cache[int, list[RemovableResponse]] = Cache(1024)
 
     async def cog_unload(self) -> None:
         self.release_hooks()
@@ -1,23 +1,51 @@
 import asyncio
 
 from collections.abc import Awaitable, Callable
-from concurrent.futures import Executor
 from functools import partial, wraps
-from typing import Optional, ParamSpec, TypeVar
+from typing import ParamSpec, TypeVar
+
+from src.cache import TieredCache
+from src.executors import ExecutorKind, get_executor
 
 T = TypeVar("T")
 P = ParamSpec("P")
 
 
-# NOTE: is there a meaningful way to use executor param? maybe use enum instead
-def in_executor(executor: Optional[Executor] = None) -> Callable[[Callable[P, T]], Callable[P, Awaitable[T]]]:
-    """Make blocking function non-blocking by running it in a given executor"""
+def in_executor(kind: ExecutorKind = ExecutorKind.IO) -> Callable[[Callable[P, T]], Callable[P, Awaitable[T]]]:
+    """Make blocking function non-blocking by running it in executor of given kind"""
 
     def inner(fn: Callable[P, T]) -> Callable[P, Awaitable[T]]:
         @wraps(fn)
         def wrapped(*args: P.args, **kwargs: P.kwargs) -> Awaitable[T]:
             loop = asyncio.get_running_loop()
-            return loop.run_in_executor(executor, partial(fn, *args, **kwargs))
+            return loop.run_in_executor(get_executor(kind), partial(fn, *args, **kwargs))
+
+        return wrapped
+
+    return inner
+
+
+def cached(
+    namespace: str,
+    *,
+    ttl: float,
+    key: Callable[..., str],
+    maxsize: int = 128,
+) -> Callable[[Callable[P, Awaitable[T]]], Callable[P, Awaitable[T]]]:
+    """
+    Cache coroutine results in memory and redis. Key is built from call arguments using key function.
+
+    Results must be serializable by orjson.
+    """
+
+    def inner(fn: Callable[P, Awaitable[T]]) -> Callable[P, Awaitable[T]]:
+        cache: TieredCache[T] = TieredCache(namespace, ttl=ttl, maxsize=maxsize)
+
+        @wraps(fn)
+        async def wrapped(*args: P.args, **kwargs: P.kwargs) -> T:
+            return await cache.get_or_compute(key(*args, **kwargs), partial(fn, *args, **kwargs))
+
+        wrapped.cache = cache  # type: ignore[attr-defined]
 
         return wrapped
 
@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import threading
+import time
+
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+from enum import Enum
+from typing import ParamSpec, TypeVar
+
+from src.settings import settings
+
+__all__ = (
+    "ExecutorKind",
+    "ExecutorStats",
+    "NamedExecutor",
+    "executors",
+    "get_executor",
+)
+
+T = TypeVar("T")
+P = ParamSpec("P")
+
+
+class ExecutorKind(Enum):
+    # network and disk, blocking library calls
+    IO = "io"
+    # Pillow and other number crunching
+    CPU = "cpu"
+    # sqlite
+    DB = "db"
+
+
+class ExecutorStats:
+    __slots__ = (
+        "queued",
+        "active",
+        "completed",
+        "total_wait",
+        "max_wait",
+        "total_run",
+    )
+
+    def __init__(self) -> None:
+        # submitted, but not started yet
+        self.queued = 0
+        self.active = 0
+        self.completed = 0
+        # seconds between submit and start
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.total_run = 0.0
+
+    @property
+    def average_wait(self) -> float:
+        if not (started := self.completed + self.active):
+            return 0.0
+
+        return self.total_wait / started
+
+    @property
+    def average_run(self) -> float:
+        if not self.completed:
+            return 0.0
+
+        return self.total_run / self.completed
+
+    def __repr__(self) -> str:
+        return (
+            f"<{type(self).__name__} queued={self.queued} active={self.active} completed={self.completed} "
+            f"average_wait={self.average_wait:.3f} max_wait={self.max_wait:.3f} average_run={self.average_run:.3f}>"
+        )
+
+
+class NamedExecutor(ThreadPoolExecutor):
+    """Thread pool that keeps track of queue depth, active workers and wait time"""
+
+    def __init__(self, name: str, max_workers: int):
+        super().__init__(max_workers=max_workers, thread_name_prefix=f"pink_{name}")
+
+        self.name = name
+        self.max_workers = max_workers
+        self.stats = ExecutorStats()
+
+        self._stats_lock = threading.Lock()
+
+    def _run(self, submitted_at: float, fn: Callable[P, T], *args: P.args, **kwargs: P.kwargs) -> T:
+        started_at = time.perf_counter()
+        wait = started_at - submitted_at
+
+        with self._stats_lock:
+            self.stats.queued -= 1
+            self.stats.active += 1
+            self.stats.total_wait += wait
+            self.stats.max_wait = max(self.stats.max_wait, wait)
+
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._stats_lock:
+                self.stats.active -= 1
+                self.stats.completed += 1
+                self.stats.total_run += time.perf_counter() - started_at
+
+    def submit(self, fn: Callable[P, T], /, *args: P.args, **kwargs: P.kwargs) -> Future[T]:
+        with self._stats_lock:
+            self.stats.queued += 1
+
+        try:
+            return super().submit(self._run, time.perf_counter(), fn, *args, **kwargs)  # type: ignore[arg-type]
+        except BaseException:
+            with self._stats_lock:
+                self.stats.queued -= 1
+
+            raise
+
+    def __repr__(self) -> str:
+        return f"<{type(self).__name__} name={self.name} max_workers={self.max_workers} stats={self.stats}>"
+
+
+_executors: dict[ExecutorKind, NamedExecutor] = {}
+_executors_lock = threading.Lock()
+
+
+def get_executor(kind: ExecutorKind) -> NamedExecutor:
+    """Returns executor of given kind, creating it on first use"""
+
+    if (executor := _executors.get(kind)) is not None:
+        return executor
+
+    with _executors_lock:
+        if (executor := _executors.get(kind)) is None:
+            executor = NamedExecutor(kind.value, getattr(settings.executors, kind.value))
+            _executors[kind] = executor
+
+    return executor
+
+
+def executors() -> dict[ExecutorKind, NamedExecutor]:
+    """All executors created so far"""
+
+    return _executors.copy()
@@ -60,8 +60,6 @@ LOGGING_CONFIG = {
     "root": {"level": "INFO", "handlers": ["colorful_console"]},
     "disable_existing_loggers": False,
     "loggers": {
-        # annoying msgpack message on init
-        "aiocache": {"level": "ERROR"},
         # too verbose
         "discord": {"level": "ERROR"},
     },
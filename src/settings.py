@@ -181,7 +181,8 @@ class BaseSettings(BaseModel):
 
         subsections = settings.__config__.section.split(".")
         for subsection in subsections:
-            data = data[subsection]
+            # missing section is fine if all its values have defaults, validation reports missing values otherwise
+            data = data.get(subsection, {})
 
         if env_prefix := settings.__config__.env_prefix:
             settings.__config__.env_prefix = f"{env_prefix}_{'_'.join(subsections).upper()}"
@@ -191,7 +192,7 @@ class BaseSettings(BaseModel):
         return settings(data=data)
 
     class Config(BaseConfig):
-        settings_file: str = "settings.toml"
+        settings_file: str = os.environ.get("PINK_SETTINGS_FILE", "settings.toml")
         loader = Loader.TOML
         env_prefix = ""
         section = ""
@@ -224,12 +225,21 @@ class Db(BaseModel):
     path: Path
 
 
+class ExecutorsSettings(BaseModel):
+    """Thread counts for each executor kind"""
+
+    io: int = 8
+    cpu: int = os.cpu_count() or 1
+    db: int = 1
+
+
 class Settings(BaseSettings):
     bot: BotSettings
     redis: RedisSettings
     sentry: SentrySettings
     owners: OwnersSettings
     db: Db
+    executors: ExecutorsSettings
 
     class Config(BaseConfig):
         env_prefix = "PINK_BOT"
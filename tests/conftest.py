@@ -0,0 +1,6 @@
+import os
+
+from pathlib import Path
+
+# settings are read on import of bot modules, tests run with example settings unless told otherwise
+os.environ.setdefault("PINK_SETTINGS_FILE", str(Path(__file__).parent.parent / "example.settings.toml"))
@@ -0,0 +1,174 @@
+import itertools
+import math
+
+from typing import Any, Optional
+
+import pytest
+
+from src.cogs.images.ocr_geometry import LineGeometry
+from src.cogs.images.ocr_lines import Line
+
+SRC_SIZE = (800, 600)
+
+_Vertices = list[dict[str, int]]
+
+
+def legacy_angle(vertices: _Vertices) -> Optional[int]:
+    # TextField._get_angle before LineGeometry, None instead of AngleUndetectableError
+    cycle = itertools.cycle(vertices)
+    first = next(cycle)
+    x, y = first.get("x"), first.get("y")
+    for i in range(4):
+        vertex = next(cycle)
+        next_x, next_y = vertex.get("x"), vertex.get("y")
+
+        if x is None or y is None or next_x is None or next_y is None:
+            x, y = next_x, next_y
+            continue
+
+        degrees = math.degrees(math.atan2(y - next_y, next_x - x))
+        if degrees < 0:
+            degrees += 360
+
+        degrees += 90 * i
+
+        break
+    else:
+        return None
+
+    return 90 * round(degrees / 90)
+
+
+def legacy_coords(vertices: _Vertices, angle: int) -> tuple[int, int, int, int]:
+    # TextField._vertices_to_coords before LineGeometry
+    if 0 <= angle <= 90:
+        order = (0, 1, 2, 3)
+    elif 90 < angle <= 180:
+        order = (1, 2, 3, 0)
+    elif 180 < angle <= 270:
+        order = (2, 3, 0, 1)
+    else:
+        order = (3, 0, 1, 2)
+
+    left = vertices[order[0]].get("x", 0)
+    upper = vertices[order[1]].get("y", 0)
+    right = vertices[order[2]].get("x", SRC_SIZE[0])
+    lower = vertices[order[3]].get("y", SRC_SIZE[1])
+
+    return left, upper, right, lower
+
+
+def legacy_field(line: Line) -> Optional[tuple[tuple[int, int, int, int], int]]:
+    # TextField.add_word: angle of first placed word, union of boxes of placed words
+    angle = None
+    box = None
+
+    for word in line.words:
+        vertices = word["boundingBox"]["vertices"]
+
+        if angle is None and (angle := legacy_angle(vertices)) is None:
+            continue
+
+        left, upper, right, lower = legacy_coords(vertices, angle)
+        if box is None:
+            box = (left, upper, right, lower)
+        else:
+            box = (min(box[0], left), min(box[1], upper), max(box[2], right), max(box[3], lower))
+
+    if box is None or angle is None:
+        return None
+
+    return box, angle
+
+
+def rotated_word(cx: float, cy: float, degrees: float, *, half_width: int = 40, half_height: int = 10) -> dict[str, Any]:
+    """Word box with vertices in API order: top left, top right, bottom right, bottom left of rotated text"""
+
+    angle = math.radians(degrees)
+    vertices = []
+
+    for dx, dy in (
+        (-half_width, -half_height),
+        (half_width, -half_height),
+        (half_width, half_height),
+        (-half_width, half_height),
+    ):
+        x = cx + dx * math.cos(angle) + dy * math.sin(angle)
+        y = cy - dx * math.sin(angle) + dy * math.cos(angle)
+        vertices.append({"x": round(x), "y": round(y)})
+
+    return {"symbols": [{"text": "w"}], "boundingBox": {"vertices": vertices}}
+
+
+def rotated_line(cx: float, cy: float, degrees: float, words: int = 3) -> Line:
+    angle = math.radians(degrees)
+    step = 100
+
+    return Line(
+        "line",
+        [rotated_word(cx + i * step * math.cos(angle), cy - i * step * math.sin(angle), degrees) for i in range(words)],
+    )
+
+
+@pytest.mark.parametrize("degrees", [0, 3, 88, 90, 135, 180, 200, 270, 300, 359])
+def test_line_geometry_matches_legacy_text_field(degrees: int) -> None:
+    lines = [rotated_line(200, 300, degrees), rotated_line(500, 200, degrees, words=1)]
+
+    boxes, angles, placed, skipped = LineGeometry(lines).boxes(SRC_SIZE)
+
+    assert skipped == []
+
+    for i, line in enumerate(lines):
+        expected = legacy_field(line)
+        assert expected is not None
+        assert placed[i]
+        assert (tuple(boxes[i].tolist()), int(angles[i])) == expected
+
+
+def test_line_geometry_missing_vertices_match_legacy_text_field() -> None:
+    line = rotated_line(300, 300, 90)
+    # first side is missing, angle comes from second one
+    del line.words[0]["boundingBox"]["vertices"][0]["x"]
+    # missing coordinates fall back to image bounds
+    del line.words[1]["boundingBox"]["vertices"][2]["y"]
+
+    boxes, angles, placed, _ = LineGeometry([line]).boxes(SRC_SIZE)
+
+    assert placed[0]
+    assert (tuple(boxes[0].tolist()), int(angles[0])) == legacy_field(line)
+
+
+def test_line_geometry_skips_words_with_undetectable_angle() -> None:
+    line = rotated_line(300, 300, 0)
+    for vertex in line.words[0]["boundingBox"]["vertices"][::2]:
+        del vertex["x"]
+
+    empty = Line("empty", [])
+    undetectable = Line("undetectable", [{"symbols": [{"text": "w"}], "boundingBox": {"vertices": [{}, {}, {}, {}]}}])
+
+    boxes, angles, placed, skipped = LineGeometry([line, empty, undetectable]).boxes(SRC_SIZE)
+
+    assert placed.tolist() == [True, False, False]
+    # first word of first line and only word of last line
+    assert skipped == [0, 3]
+    assert (tuple(boxes[0].tolist()), int(angles[0])) == legacy_field(line)
+
+
+def test_line_geometry_wraps_angles_over_360() -> None:
+    # angle from second side pushes degrees over 405, legacy code failed on this
+    line = Line("line", [rotated_word(300, 300, 50)])
+    del line.words[0]["boundingBox"]["vertices"][0]["x"]
+
+    _, angles, placed, _ = LineGeometry([line]).boxes(SRC_SIZE)
+
+    assert placed[0]
+    assert 0 <= int(angles[0]) <= 360
+
+
+def test_line_geometry_without_words() -> None:
+    boxes, angles, placed, skipped = LineGeometry([]).boxes(SRC_SIZE)
+
+    assert boxes.shape == (0, 4)
+    assert angles.shape == (0,)
+    assert placed.shape == (0,)
+    assert skipped == []
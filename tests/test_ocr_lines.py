@@ -0,0 +1,127 @@
+from typing import Any, Optional
+
+from src.cogs.images.ocr_lines import annotation_lines, compact_annotations
+
+
+def make_word(text: str, x: int, y: int, detected_break: Optional[str] = "SPACE") -> dict[str, Any]:
+    width = 10 * len(text)
+    symbols: list[dict[str, Any]] = [
+        {
+            "text": char,
+            "confidence": 0.99,
+            "boundingBox": {"vertices": [{"x": x + 10 * i, "y": y}, {"x": x + 10 * i + 10, "y": y}]},
+        }
+        for i, char in enumerate(text)
+    ]
+    if detected_break is not None:
+        symbols[-1]["property"] = {
+            "detectedBreak": {"type": detected_break},
+            "detectedLanguages": [{"languageCode": "en"}],
+        }
+
+    return {
+        "property": {"detectedLanguages": [{"languageCode": "en"}]},
+        "confidence": 0.98,
+        "boundingBox": {
+            "vertices": [
+                {"x": x, "y": y},
+                {"x": x + width, "y": y},
+                {"x": x + width, "y": y + 20},
+                {"x": x, "y": y + 20},
+            ]
+        },
+        "symbols": symbols,
+    }
+
+
+def make_annotation(paragraphs: list[list[dict[str, Any]]], text: str) -> dict[str, Any]:
+    return {
+        "textAnnotations": [{"description": text}, *[{"description": "word"} for _ in range(5)]],
+        "fullTextAnnotation": {
+            "text": text,
+            "pages": [
+                {
+                    "width": 100,
+                    "height": 100,
+                    "confidence": 0.9,
+                    "blocks": [
+                        {
+                            "confidence": 0.9,
+                            "blockType": "TEXT",
+                            "paragraphs": [{"confidence": 0.9, "words": words} for words in paragraphs],
+                        }
+                    ],
+                }
+            ],
+        },
+    }
+
+
+def sample_annotation() -> dict[str, Any]:
+    return make_annotation(
+        [
+            [
+                make_word("hello", 0, 0),
+                make_word("world", 60, 0, "EOL_SURE_SPACE"),
+                make_word("second", 0, 30, "LINE_BREAK"),
+            ],
+            # paragraph ends line even without break
+            [make_word("last", 0, 60, None)],
+        ],
+        "hello world\nsecond\nlast\n",
+    )
+
+
+def test_annotation_lines_groups_words_by_breaks() -> None:
+    lines = annotation_lines(sample_annotation())
+
+    assert [line.text for line in lines] == ["hello world", "second", "last"]
+    assert [len(line.words) for line in lines] == [2, 1, 1]
+    assert lines[0].words[1]["boundingBox"]["vertices"][0] == {"x": 60, "y": 0}
+
+
+def test_annotation_lines_rebuilds_text_from_symbols_on_mismatch() -> None:
+    annotation = make_annotation(
+        [[make_word("multi", 0, 0, "HYPHEN"), make_word("line", 0, 30, "LINE_BREAK")]],
+        "multi-line\n",
+    )
+
+    assert [line.text for line in annotation_lines(annotation)] == ["multi-", "line"]
+
+
+def test_annotation_lines_without_text() -> None:
+    assert annotation_lines({}) == []
+    assert annotation_lines(make_annotation([], "")) == []
+
+
+def test_compact_annotations_drops_unused_data() -> None:
+    compact = compact_annotations(sample_annotation())
+
+    assert compact["textAnnotations"] == [{"description": "hello world\nsecond\nlast\n"}]
+
+    page = compact["fullTextAnnotation"]["pages"][0]
+    assert "confidence" not in page
+    assert page["width"] == 100
+    assert page["blocks"][0]["blockType"] == "TEXT"
+
+    word = page["blocks"][0]["paragraphs"][0]["words"][1]
+    assert "confidence" not in word
+    assert word["property"] == {"detectedLanguages": [{"languageCode": "en"}]}
+    assert word["symbols"][:-1] == [{"text": char} for char in "worl"]
+    assert word["symbols"][-1] == {"text": "d", "property": {"detectedBreak": {"type": "EOL_SURE_SPACE"}}}
+
+
+def test_compact_annotations_keeps_lines() -> None:
+    annotation = sample_annotation()
+    lines = annotation_lines(annotation)
+    compact_lines = annotation_lines(compact_annotations(annotation))
+
+    assert [line.text for line in compact_lines] == [line.text for line in lines]
+    assert [[word["boundingBox"] for word in line.words] for line in compact_lines] == [
+        [word["boundingBox"] for word in line.words] for line in lines
+    ]
+
+
+def test_compact_annotations_without_text() -> None:
+    assert compact_annotations({}) == {}
+    assert compact_annotations({"error": {"code": 3}}) == {"error": {"code": 3}}